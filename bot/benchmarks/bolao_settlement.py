@@ -0,0 +1,110 @@
+"""Benchmark for bolão settlement with a large pool.
+
+Seeds a bolão with --participants random guesses (and a wallet for each
+participant) in a scratch database, then times:
+  * the scoring pass over every guess (score_bolao),
+  * paying the winners one update_one + insert_one at a time, as the site does,
+  * paying the same winners with one bulk_write per collection, as the bot does.
+
+Run from the bot directory against a disposable MongoDB:
+    MONGODB_URI=mongodb://localhost:27017 python benchmarks/bolao_settlement.py
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne, InsertOne
+from cogs.bolao import score_bolao, split_prize
+from utils import ledger
+
+load_dotenv()
+
+ENTRY_FEE = 5
+FINAL_SCORE = (2, 1)
+
+
+async def seed(db, participants: int):
+    await db.wallets.create_index("userId")
+    await db.wallets.insert_many(
+        [{"userId": str(i), "balance": 0, "transactions": []} for i in range(participants)],
+        ordered=False
+    )
+    bolao = {
+        "homeTeam": "Corinthians",
+        "awayTeam": "Palmeiras",
+        "entryFee": ENTRY_FEE,
+        "prizePool": ENTRY_FEE * participants,
+        "status": "Aberto",
+        "participants": [
+            {"userId": str(i), "guess": {"home": random.randint(0, 4), "away": random.randint(0, 4)}}
+            for i in range(participants)
+        ],
+    }
+    await db.boloes.insert_one(bolao)
+    return bolao
+
+
+def payout_transactions(winner_ids: list, prize: float) -> list:
+    return [
+        (user_id, ledger.new_transaction("Prêmio", "Ganhos do Bolão: Corinthians vs Palmeiras", prize))
+        for user_id in winner_ids
+    ]
+
+
+async def pay_sequentially(db, prize: float, payouts: list):
+    for user_id, transaction in payouts:
+        await db.wallets.update_one({"userId": user_id}, ledger.wallet_update(prize, transaction))
+        await db.wallet_transactions.insert_one(ledger.ledger_entry(user_id, transaction))
+
+
+async def pay_in_bulk(db, prize: float, payouts: list):
+    await db.wallets.bulk_write([
+        UpdateOne({"userId": user_id}, ledger.wallet_update(prize, transaction))
+        for user_id, transaction in payouts
+    ], ordered=False)
+    await db.wallet_transactions.bulk_write([
+        InsertOne(ledger.ledger_entry(user_id, transaction))
+        for user_id, transaction in payouts
+    ], ordered=False)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--participants", type=int, default=50_000)
+    parser.add_argument("--database", default="timaocord_benchmark")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.getenv("MONGODB_URI"))
+    await client.drop_database(args.database)
+    db = client[args.database]
+    try:
+        print(f"Seeding a bolão with {args.participants} participants...")
+        bolao = await seed(db, args.participants)
+
+        started = time.perf_counter()
+        winner_ids, exact = score_bolao(bolao["participants"], *FINAL_SCORE)
+        scoring = time.perf_counter() - started
+        prize = split_prize(bolao["prizePool"], len(winner_ids))
+        print(f"Scoring pass: {scoring * 1000:.1f} ms for {args.participants} guesses "
+              f"({len(winner_ids)} {'exact' if exact else 'closest'} winners, R$ {prize:.2f} each)")
+
+        for label, pay in (("Sequential payouts", pay_sequentially), ("Bulk payouts", pay_in_bulk)):
+            payouts = payout_transactions(winner_ids, prize)
+            started = time.perf_counter()
+            await pay(db, prize, payouts)
+            elapsed = time.perf_counter() - started
+            print(f"{label}: {elapsed * 1000:.1f} ms for {len(winner_ids)} winners")
+    finally:
+        await client.drop_database(args.database)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
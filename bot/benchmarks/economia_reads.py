@@ -0,0 +1,119 @@
+"""Benchmark for the /saldo and /perfil reads.
+
+Seeds one user whose wallet embeds --transactions transactions, then compares
+the old full-document reads with the projected, concurrent reads Economia uses
+now. Reports the median latency and the BSON bytes returned by each path.
+
+Run from the bot directory against a disposable MongoDB:
+    MONGODB_URI=mongodb://localhost:27017 python benchmarks/economia_reads.py
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bson
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from cogs.economia import SALDO_WALLET_PROJECTION, PERFIL_USER_PROJECTION, PERFIL_STATS_PROJECTION
+from utils import ledger
+
+load_dotenv()
+
+USER_ID = "123456789012345678"
+
+
+async def seed(db, transactions: int):
+    await db.users.insert_one({
+        "discordId": USER_ID,
+        "name": "Torcedor",
+        "email": "torcedor@example.com",
+        "image": "https://cdn.discordapp.com/avatars/123/abc.png",
+        "level": 12,
+        "xp": 4_200,
+        "unlockedAchievements": [f"achievement_{i}" for i in range(40)],
+    })
+    await db.wallets.insert_one({
+        "userId": USER_ID,
+        "balance": 1_000,
+        "transactions": [ledger.new_transaction("Aposta", f"Aposta #{i}", -10) for i in range(transactions)],
+    })
+    await db.user_stats.insert_one({
+        "userId": USER_ID,
+        "totalBets": 300, "betsWon": 120, "betsLost": 180,
+        "totalWagered": 3_000, "totalWinnings": 3_600,
+        "history": [{"date": i, "profit": i % 7} for i in range(500)],
+    })
+    await db.users.create_index("discordId")
+    await db.wallets.create_index("userId")
+    await db.user_stats.create_index("userId")
+
+
+async def saldo_full(db):
+    return [
+        await db.users.find_one({"discordId": USER_ID}),
+        await db.wallets.find_one({"userId": USER_ID}),
+    ]
+
+
+async def saldo_projected(db):
+    return await asyncio.gather(
+        db.users.find_one({"discordId": USER_ID}, {"_id": 1}),
+        db.wallets.find_one({"userId": USER_ID}, SALDO_WALLET_PROJECTION),
+    )
+
+
+async def perfil_full(db):
+    return [
+        await db.users.find_one({"discordId": USER_ID}),
+        await db.user_stats.find_one({"userId": USER_ID}),
+    ]
+
+
+async def perfil_projected(db):
+    return await asyncio.gather(
+        db.users.find_one({"discordId": USER_ID}, PERFIL_USER_PROJECTION),
+        db.user_stats.find_one({"userId": USER_ID}, PERFIL_STATS_PROJECTION),
+    )
+
+
+async def measure(runs: int, read) -> tuple[float, int]:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        docs = await read()
+        timings.append(time.perf_counter() - started)
+    returned_bytes = sum(len(bson.encode(doc)) for doc in docs if doc)
+    return statistics.median(timings) * 1000, returned_bytes
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transactions", type=int, default=5_000)
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--database", default="timaocord_benchmark")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.getenv("MONGODB_URI"))
+    await client.drop_database(args.database)
+    db = client[args.database]
+    try:
+        print(f"Seeding a wallet with {args.transactions} transactions...")
+        await seed(db, args.transactions)
+
+        for command, old_read, new_read in (("saldo", saldo_full, saldo_projected), ("perfil", perfil_full, perfil_projected)):
+            old_ms, old_bytes = await measure(args.runs, lambda: old_read(db))
+            new_ms, new_bytes = await measure(args.runs, lambda: new_read(db))
+            print(f"/{command}: full documents {old_ms:.2f} ms / {old_bytes:,} bytes, "
+                  f"projected {new_ms:.2f} ms / {new_bytes:,} bytes (median of {args.runs})")
+    finally:
+        await client.drop_database(args.database)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
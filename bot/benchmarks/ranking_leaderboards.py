@@ -0,0 +1,97 @@
+"""Benchmark for the /ranking leaderboards.
+
+Seeds --users users, wallets and user_stats in a scratch database, then times
+each category the old way (top 10, then one users.find_one per row for the
+name) against the single $lookup aggregation /ranking uses now.
+
+Run from the bot directory against a disposable MongoDB:
+    MONGODB_URI=mongodb://localhost:27017 python benchmarks/ranking_leaderboards.py
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from cogs.ranking import leaderboard_pipeline
+
+load_dotenv()
+
+# category: (collection, match, sort field)
+CATEGORIES = {
+    "ganhadores": ("user_stats", {"totalWinnings": {"$gt": 0}}, "totalWinnings"),
+    "ricos": ("wallets", {}, "balance"),
+    "ativos": ("user_stats", {}, "totalBets"),
+}
+
+
+async def seed(db, users: int):
+    await db.users.insert_many(
+        [{"discordId": str(i), "name": f"Torcedor {i}", "level": 1, "xp": 0} for i in range(users)],
+        ordered=False
+    )
+    await db.wallets.insert_many(
+        [{"userId": str(i), "balance": random.uniform(0, 10_000)} for i in range(users)],
+        ordered=False
+    )
+    await db.user_stats.insert_many(
+        [{"userId": str(i), "totalWinnings": random.uniform(0, 5_000), "totalBets": random.randint(0, 500)} for i in range(users)],
+        ordered=False
+    )
+    await db.users.create_index("discordId")
+    await db.wallets.create_index([("balance", -1)])
+    await db.user_stats.create_index([("totalWinnings", -1)])
+    await db.user_stats.create_index([("totalBets", -1)])
+
+
+async def top_with_name_lookups(db, collection: str, match: dict, sort_field: str):
+    rows = await db[collection].find(match).sort(sort_field, -1).limit(10).to_list(length=10)
+    for row in rows:
+        await db.users.find_one({"discordId": row["userId"]})
+    return rows
+
+
+async def top_with_lookup_pipeline(db, collection: str, match: dict, sort_field: str):
+    return await db[collection].aggregate(leaderboard_pipeline(match, sort_field)).to_list(length=10)
+
+
+async def time_runs(runs: int, fetch) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await fetch()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--database", default="timaocord_benchmark")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.getenv("MONGODB_URI"))
+    await client.drop_database(args.database)
+    db = client[args.database]
+    try:
+        print(f"Seeding {args.users} users...")
+        await seed(db, args.users)
+
+        for category, (collection, match, sort_field) in CATEGORIES.items():
+            old = await time_runs(args.runs, lambda: top_with_name_lookups(db, collection, match, sort_field))
+            new = await time_runs(args.runs, lambda: top_with_lookup_pipeline(db, collection, match, sort_field))
+            print(f"{category}: find + 10 name lookups {old:.2f} ms, $lookup aggregation {new:.2f} ms (median of {args.runs})")
+    finally:
+        await client.drop_database(args.database)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
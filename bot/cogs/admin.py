@@ -2,10 +2,10 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import os
-from pymongo import MongoClient
 from dotenv import load_dotenv
-from bson.objectid import ObjectId
+from utils.database import get_client
+from utils.bot_config import get_config_provider
+from utils.indexes import ensure_indexes, find_collection_scans
 import datetime
 
 load_dotenv()
@@ -18,11 +18,8 @@ def is_admin():
     async def predicate(interaction: discord.Interaction) -> bool:
         # This assumes the bot object is accessible via interaction.client
         bot = interaction.client
-        # The database connection is also stored on the bot object in this design
-        config_collection = bot.db.timaocord_bot.config
-        
-        # Fixed ID for the single bot config document
-        config_doc = config_collection.find_one({"_id": ObjectId('669fdb5a907548817b848c48')})
+        # The shared config provider is also stored on the bot object in this design
+        config_doc = await get_config_provider(bot).get()
         
         if not config_doc or not config_doc.get('adminRoleId'):
             await interaction.response.send_message("❌ O cargo de administrador não está configurado. Não é possível usar este comando.", ephemeral=True)
@@ -47,16 +44,13 @@ def is_admin():
 class Admin(commands.Cog):
     def __init__(self, bot):
         self.bot: commands.Bot = bot
-        # Store the db client on the bot object so checks can access it
-        if not hasattr(bot, 'db'):
-            bot.db = MongoClient(os.getenv('MONGODB_URI'))
-        
-        self.client = bot.db
+        # The shared client lives on the bot object so checks can access it
+        self.client = get_client(bot)
         self.db_timaocord = self.client.timaocord
         self.users_collection = self.db_timaocord.users
         self.bets_collection = self.db_timaocord.bets
         self.matches_collection = self.db_timaocord.matches
-        self.config_collection = self.client.timaocord_bot.config
+        self.config_provider = get_config_provider(bot)
 
     def cog_unload(self):
         # The client is shared, so we don't close it here.
@@ -65,7 +59,7 @@ class Admin(commands.Cog):
 
     # --- Utility Functions ---
     async def get_config(self):
-        return self.config_collection.find_one({"_id": ObjectId('669fdb5a907548817b848c48')})
+        return await self.config_provider.get()
 
     async def log_action(self, title: str, description: str, color: discord.Color, interaction: discord.Interaction):
         config = await self.get_config()
@@ -97,6 +91,8 @@ class Admin(commands.Cog):
             "`/admin anuncio [canal] [titulo] [mensagem]`: Envia um anúncio em um canal específico.",
             "`/admin ban [usuário] [motivo]`: Bane um usuário do Discord e da plataforma.",
             "`/admin unban [id_usuario] [motivo]`: Desbane um usuário do Discord.",
+            "`/admin recarregar_config`: Recarrega as configurações do bot salvas no painel.",
+            "`/admin indices`: Cria os índices que faltam e mostra consultas que ainda varrem coleções inteiras.",
         ]
         
         embed.add_field(name="Comandos", value="\n".join(command_list), inline=False)
@@ -108,15 +104,15 @@ class Admin(commands.Cog):
     async def status_plataforma(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
         
-        total_users = self.users_collection.count_documents({})
-        total_bets = self.bets_collection.count_documents({})
+        total_users = await self.users_collection.count_documents({})
+        total_bets = await self.bets_collection.count_documents({})
         
         wagered_pipeline = [{"$group": {"_id": None, "total": {"$sum": "$stake"}}}]
-        wagered_result = list(self.bets_collection.aggregate(wagered_pipeline))
+        wagered_result = await self.bets_collection.aggregate(wagered_pipeline).to_list(length=1)
         total_wagered = wagered_result[0]['total'] if wagered_result else 0
         
         winnings_pipeline = [{"$match": {"status": "Ganha"}}, {"$group": {"_id": None, "total": {"$sum": "$potentialWinnings"}}}]
-        winnings_result = list(self.bets_collection.aggregate(winnings_pipeline))
+        winnings_result = await self.bets_collection.aggregate(winnings_pipeline).to_list(length=1)
         total_winnings = winnings_result[0]['total'] if winnings_result else 0
         
         gross_profit = total_wagered - total_winnings
@@ -137,7 +133,7 @@ class Admin(commands.Cog):
         
         now_ts = int(datetime.datetime.now().timestamp())
         
-        next_match = self.matches_collection.find_one({
+        next_match = await self.matches_collection.find_one({
             "$or": [{"homeTeam": "Corinthians"}, {"awayTeam": "Corinthians"}],
             "timestamp": {"$gte": now_ts},
             "status": "NS"
@@ -190,7 +186,7 @@ class Admin(commands.Cog):
             return
             
         # 2. Suspend on platform
-        self.users_collection.update_one({"discordId": str(usuario.id)}, {"$set": {"status": "Suspenso"}})
+        await self.users_collection.update_one({"discordId": str(usuario.id)}, {"$set": {"status": "Suspenso"}})
         
         # 3. Log action
         log_desc = f"**Usuário:** {usuario.mention} (`{usuario.id}`)\n**Admin:** {interaction.user.mention}\n**Motivo:** {motivo}"
@@ -224,7 +220,7 @@ class Admin(commands.Cog):
              return
              
         # 2. Unsuspend on platform
-        self.users_collection.update_one({"discordId": id_usuario}, {"$set": {"status": "Ativo"}})
+        await self.users_collection.update_one({"discordId": id_usuario}, {"$set": {"status": "Ativo"}})
 
         # 3. Log action
         log_desc = f"**Usuário:** {user.name} (`{user.id}`)\n**Admin:** {interaction.user.mention}\n**Motivo:** {motivo}"
@@ -232,6 +228,50 @@ class Admin(commands.Cog):
 
         await interaction.followup.send(f"✅ Usuário {user.name} foi desbanido com sucesso.", ephemeral=True)
 
+    @admin_group.command(name="recarregar_config", description="🔄 Recarrega as configurações do bot salvas no painel.")
+    @is_admin()
+    async def recarregar_config(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+
+        self.config_provider.invalidate()
+        await self.config_provider.get()
+
+        # Schedules live in the config too, so pick up changes right away
+        tasks_cog = self.bot.get_cog('Tasks')
+        if tasks_cog:
+            await tasks_cog.reload_schedules()
+        await interaction.followup.send("✅ Configurações do bot recarregadas.", ephemeral=True)
+
+    @admin_group.command(name="indices", description="🗂️ Verifica os índices do banco de dados.")
+    @is_admin()
+    async def indices(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+
+        created = await ensure_indexes(self.db_timaocord)
+        try:
+            scans = await find_collection_scans(self.db_timaocord)
+        except Exception as e:
+            await interaction.followup.send(f"❌ Não foi possível analisar as consultas: {e}", ephemeral=True)
+            return
+
+        embed = discord.Embed(title="🗂️ Diagnóstico de Índices", color=0xe67e22 if scans else 0x1abc9c)
+        if created:
+            embed.add_field(
+                name="Índices Criados",
+                value="\n".join(f"`{collection}`: {', '.join(names)}" for collection, names in created.items()),
+                inline=False
+            )
+        if scans:
+            embed.description = "Estas consultas ainda varrem a coleção inteira (COLLSCAN):"
+            embed.add_field(
+                name="Consultas sem Índice",
+                value="\n".join(f"• {label} (`{collection}`)" for label, collection, _ in scans),
+                inline=False
+            )
+        else:
+            embed.description = "✅ Todas as consultas verificadas usam índices."
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
 
 async def setup(bot):
     await bot.add_cog(Admin(bot))
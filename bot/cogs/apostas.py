@@ -1,33 +1,121 @@
 import discord
 from discord.ext import commands
-from discord import app_commands
+from discord import app_commands, ui
 import datetime
-import os
-from pymongo import MongoClient
 from dotenv import load_dotenv
+from utils.database import get_client
 
 load_dotenv()
 
+BETS_PER_PAGE = 5
+OPEN_BETS_SORT = [("createdAt", -1), ("_id", -1)]
+
+def open_bets_filter(user_id: str, after: dict | None = None) -> dict:
+    """Open bets of the user, optionally only those after `after` in newest-first order."""
+    query = {"userId": user_id, "status": "Em Aberto"}
+    if after:
+        query["$or"] = [
+            {"createdAt": {"$lt": after["createdAt"]}},
+            {"createdAt": after["createdAt"], "_id": {"$lt": after["_id"]}}
+        ]
+    return query
+
+def build_bets_embed(user: discord.abc.User, bets: list, page: int, has_more: bool) -> discord.Embed:
+    embed = discord.Embed(
+        title="🎟️ Suas Apostas em Aberto",
+        color=0x1E90FF,
+        timestamp=datetime.datetime.now(datetime.timezone.utc)
+    )
+    embed.set_author(name=user.display_name, icon_url=user.display_avatar.url)
+
+    for bet in bets:
+        bet_title = f"Aposta de R$ {bet['stake']:.2f}"
+        bet_description = ""
+        for selection in bet['bets']:
+            bet_description += f"**{selection['selection']}** em {selection['teamA']} vs {selection['teamB']} @ {selection['oddValue']}\n"
+        
+        bet_description += f"\n**Retorno Potencial:** R$ {bet['potentialWinnings']:.2f}"
+        embed.add_field(name=bet_title, value=bet_description, inline=False)
+
+    footer = f"Página {page + 1}"
+    if has_more:
+        footer += " • Use os botões para ver mais apostas."
+    embed.set_footer(text=footer)
+    return embed
+
+class OpenBetsView(ui.View):
+    """Pages through open bets with a (createdAt, _id) keyset cursor instead of skip/count."""
+    def __init__(self, cog: 'Apostas', user: discord.abc.User):
+        super().__init__(timeout=180.0)
+        self.cog = cog
+        self.user = user
+        self.user_id = str(user.id)
+        self.page = 0
+        # Stores page: last bet of the previous page, so going back re-runs the same cursor
+        self.page_cursors = [None]
+        self.bets = []
+        self.has_more = False
+        self.message = None
+
+    async def load_page(self, page: int):
+        cursor = self.page_cursors[page]
+        projection = {"createdAt": 1, "stake": 1, "bets": 1, "potentialWinnings": 1}
+        rows = await self.cog.bets.find(open_bets_filter(self.user_id, cursor), projection).sort(
+            OPEN_BETS_SORT
+        ).limit(BETS_PER_PAGE + 1).to_list(length=BETS_PER_PAGE + 1)
+
+        # The extra row only tells us whether a next page exists
+        self.has_more = len(rows) > BETS_PER_PAGE
+        self.bets = rows[:BETS_PER_PAGE]
+        self.page = page
+        if self.has_more and len(self.page_cursors) == page + 1:
+            self.page_cursors.append({"createdAt": self.bets[-1]["createdAt"], "_id": self.bets[-1]["_id"]})
+
+        self.previous_page.disabled = page == 0
+        self.next_page.disabled = not self.has_more
+
+    def embed(self) -> discord.Embed:
+        return build_bets_embed(self.user, self.bets, self.page, self.has_more)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.user.id
+
+    async def on_timeout(self):
+        if self.message:
+            for item in self.children:
+                item.disabled = True
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+
+    @ui.button(label="◀ Anterior", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: ui.Button):
+        await self.load_page(max(self.page - 1, 0))
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+    @ui.button(label="Próxima ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: ui.Button):
+        if self.page + 1 < len(self.page_cursors):
+            await self.load_page(self.page + 1)
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+
 class Apostas(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.client = MongoClient(os.getenv('MONGODB_URI'))
+        self.client = get_client(bot)
         self.db = self.client.timaocord
         self.bets = self.db.bets
 
-    def cog_unload(self):
-        self.client.close()
-
     @app_commands.command(name="minhas-apostas", description="🎟️ Veja suas apostas em aberto.")
     async def minhas_apostas(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
-        user_id = str(interaction.user.id)
-        
-        user_bets = self.bets.find({"userId": user_id, "status": "Em Aberto"}).sort("createdAt", -1).limit(5)
-        
-        open_bets = list(user_bets)
 
-        if not open_bets:
+        view = OpenBetsView(self, interaction.user)
+        await view.load_page(0)
+
+        if not view.bets:
             embed = discord.Embed(
                 title="🎟️ Minhas Apostas em Aberto",
                 description="Você não tem nenhuma aposta em aberto no momento.",
@@ -36,26 +124,11 @@ class Apostas(commands.Cog):
             await interaction.followup.send(embed=embed)
             return
 
-        embed = discord.Embed(
-            title="🎟️ Suas Últimas Apostas em Aberto",
-            color=0x1E90FF,
-            timestamp=datetime.datetime.now(datetime.timezone.utc)
-        )
-        embed.set_author(name=interaction.user.display_name, icon_url=interaction.user.display_avatar.url)
-
-        for bet in open_bets:
-            bet_title = f"Aposta de R$ {bet['stake']:.2f}"
-            bet_description = ""
-            for selection in bet['bets']:
-                bet_description += f"**{selection['selection']}** em {selection['teamA']} vs {selection['teamB']} @ {selection['oddValue']}\n"
-            
-            bet_description += f"\n**Retorno Potencial:** R$ {bet['potentialWinnings']:.2f}"
-            embed.add_field(name=bet_title, value=bet_description, inline=False)
-            
-        if self.bets.count_documents({"userId": user_id, "status": "Em Aberto"}) > 5:
-            embed.set_footer(text="Mostrando as 5 apostas mais recentes. Para ver todas, acesse o site.")
-
-        await interaction.followup.send(embed=embed)
+        if not view.has_more:
+            await interaction.followup.send(embed=view.embed())
+            return
+
+        view.message = await interaction.followup.send(embed=view.embed(), view=view, wait=True)
 
 async def setup(bot):
     await bot.add_cog(Apostas(bot))
@@ -3,29 +3,83 @@ import discord
 from discord.ext import commands
 from discord import app_commands, ui
 import os
-from pymongo import MongoClient
 from dotenv import load_dotenv
+from utils.database import get_client
+from utils.user_cache import get_user_cache
+from utils.indexes import ensure_collection_indexes
+from utils import ledger
 from bson.objectid import ObjectId
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import OperationFailure, DuplicateKeyError
+import asyncio
 import datetime
 
 load_dotenv()
 
-# Helper para verificar se o usuário existe no banco de dados do site
-def get_user_data(user_id, db):
-    user = db.users.find_one({"discordId": user_id})
-    return user is not None
+# Standalone servers reject transactions with IllegalOperation
+TRANSACTION_UNSUPPORTED_CODES = {20}
+# Matches bolões that are open; older documents have no status and count as open
+OPEN_BOLAO_STATUS = {"$in": ["Aberto", None]}
+# Held while the bot pays a bolão, so neither new entries nor the site's settlement touch it
+SETTLING_BOLAO_STATUS = "Apurando"
+# /bolao only needs these fields, never the embedded participants array
+BOLAO_PROJECTION = {"homeTeam": 1, "awayTeam": 1, "entryFee": 1, "status": 1}
+
+# Settlement only needs each participant's id and guess
+SETTLEMENT_PROJECTION = {
+    "homeTeam": 1, "awayTeam": 1, "entryFee": 1, "prizePool": 1, "status": 1, "settlement": 1,
+    "participants.userId": 1, "participants.guess": 1
+}
+
+def score_bolao(participants: list, home: int, away: int) -> tuple[list, bool]:
+    """Returns the winning user ids and whether they hit the exact score.
+
+    Exact hits win when there are any; otherwise the guesses closest to the final
+    score (by total goal difference) share the pool. One pass over the guesses.
+    """
+    exact = []
+    closest = []
+    closest_distance = None
+    for participant in participants:
+        guess = participant.get('guess') or {}
+        try:
+            distance = abs(int(guess['home']) - home) + abs(int(guess['away']) - away)
+        except (KeyError, TypeError, ValueError):
+            continue
+
+        if distance == 0:
+            exact.append(participant['userId'])
+        elif not exact:
+            if closest_distance is None or distance < closest_distance:
+                closest_distance = distance
+                closest = [participant['userId']]
+            elif distance == closest_distance:
+                closest.append(participant['userId'])
+
+    if exact:
+        return exact, True
+    return closest, False
+
+def split_prize(prize_pool: float, winners: int) -> float:
+    """Each winner's share rounded down to the cent, so the shares never exceed the pool."""
+    if winners <= 0:
+        return 0
+    return (round(prize_pool * 100) // winners) / 100
+
+class EntryRejected(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
 
 # Modal para o usuário inserir o palpite do placar
 class ScoreModal(ui.Modal, title='Palpite do Bolão'):
     home_score = ui.TextInput(label='Placar Time Casa', style=discord.TextStyle.short, required=True, max_length=2, placeholder="0")
     away_score = ui.TextInput(label='Placar Time Visitante', style=discord.TextStyle.short, required=True, max_length=2, placeholder="0")
 
-    def __init__(self, bolao, db):
+    def __init__(self, bolao, cog: 'BolaoCog'):
         super().__init__()
         self.bolao = bolao
-        self.db = db
-        self.wallets_collection = self.db.wallets
-        self.boloes_collection = self.db.boloes
+        self.cog = cog
 
     async def on_submit(self, interaction: discord.Interaction):
         try:
@@ -37,71 +91,126 @@ class ScoreModal(ui.Modal, title='Palpite do Bolão'):
             await interaction.response.send_message("Por favor, insira um placar válido (apenas números inteiros positivos).", ephemeral=True)
             return
 
-        user_id = str(interaction.user.id)
-        
-        # Confirmação final do saldo antes de cobrar
-        user_wallet = self.wallets_collection.find_one({"userId": user_id})
-        if not user_wallet or user_wallet.get('balance', 0) < self.bolao['entryFee']:
-            await interaction.response.send_message("❌ Saldo insuficiente para entrar no bolão.", ephemeral=True)
-            return
-            
-        try:
-            # 1. Deduz a taxa da carteira do usuário
-            new_transaction = {
-                "id": str(ObjectId()),
-                "type": "Aposta",
-                "description": f"Entrada no Bolão: {self.bolao['homeTeam']} vs {self.bolao['awayTeam']}",
-                "amount": -self.bolao['entryFee'],
-                "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
-                "status": "Concluído"
-            }
-            self.wallets_collection.update_one(
-                {"userId": user_id},
-                {
-                    "$inc": {"balance": -self.bolao['entryFee']},
-                    "$push": {"transactions": {"$each": [new_transaction], "$sort": {"date": -1}}}
-                }
-            )
-            
-            # 2. Adiciona o participante ao bolão e atualiza o prêmio
-            new_participant = {
-                "userId": user_id,
-                "name": interaction.user.display_name,
-                "avatar": str(interaction.user.display_avatar.url),
-                "guess": {"home": home, "away": away},
-                "guessedAt": datetime.datetime.now(datetime.timezone.utc)
-            }
-            
-            self.boloes_collection.update_one(
-                {"_id": self.bolao['_id']},
-                {
-                    "$inc": {"prizePool": self.bolao['entryFee']},
-                    "$push": {"participants": new_participant}
-                }
-            )
-
-            embed = discord.Embed(
-                title="✅ Palpite Registrado!",
-                description=f"Seu palpite de **{self.bolao['homeTeam']} {home} x {away} {self.bolao['awayTeam']}** foi registrado com sucesso!\n\nBoa sorte! 🍀",
-                color=0x00FF00
-            )
-            await interaction.response.send_message(embed=embed, ephemeral=True)
+        new_participant = {
+            "userId": str(interaction.user.id),
+            "name": interaction.user.display_name,
+            "avatar": str(interaction.user.display_avatar.url),
+            "guess": {"home": home, "away": away},
+            "guessedAt": datetime.datetime.now(datetime.timezone.utc)
+        }
 
+        try:
+            result = await self.cog.enter_bolao(self.bolao, new_participant)
         except Exception as e:
             print(f"Erro ao submeter o bolão: {e}")
             await interaction.response.send_message("Ocorreu um erro ao processar seu palpite. Tente novamente.", ephemeral=True)
+            return
+
+        if result == "INSUFFICIENT_FUNDS":
+            await interaction.response.send_message("❌ Saldo insuficiente para entrar no bolão.", ephemeral=True)
+            return
+
+        if result == "UNAVAILABLE":
+            await interaction.response.send_message("❌ Você já participou deste bolão ou ele não está mais aberto para palpites.", ephemeral=True)
+            return
+
+        embed = discord.Embed(
+            title="✅ Palpite Registrado!",
+            description=f"Seu palpite de **{self.bolao['homeTeam']} {home} x {away} {self.bolao['awayTeam']}** foi registrado com sucesso!\n\nBoa sorte! 🍀",
+            color=0x00FF00
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
 
 
 class BolaoCog(commands.Cog, name="bolao"):
     def __init__(self, bot):
         self.bot = bot
-        self.client = MongoClient(os.getenv('MONGODB_URI'))
+        self.client = get_client(bot)
         self.db = self.client.timaocord
         self.boloes = self.db.boloes
+        # One document per participant: {bolaoId, userId, name, avatar, guess, guessedAt}
+        self.bolao_entries = self.db.bolao_entries
         self.wallets = self.db.wallets
+        self.user_cache = get_user_cache(bot)
+        # None until the first entry finds out whether the deployment supports transactions
+        self.transactions_supported = None
+
+    async def cog_load(self):
+        # The unique (bolaoId, userId) index is what rejects a second entry
+        try:
+            await ensure_collection_indexes(self.db, "bolao_entries")
+        except Exception as e:
+            print(f"Error creating bolão entry indexes: {e}")
+
+    async def apply_entry(self, bolao, participant: dict, transaction: dict, session=None):
+        """Debits the fee only if the balance covers it and joins only if the user isn't in yet."""
+        user_id = participant['userId']
+        entry_fee = bolao['entryFee']
+
+        debit = await self.wallets.update_one(
+            {"userId": user_id, "balance": {"$gte": entry_fee}},
+            ledger.wallet_update(-entry_fee, transaction),
+            session=session
+        )
+        if debit.matched_count == 0:
+            raise EntryRejected("INSUFFICIENT_FUNDS")
+
+        try:
+            entry = await self.bolao_entries.insert_one({"bolaoId": bolao['_id'], **participant}, session=session)
+        except DuplicateKeyError:
+            raise EntryRejected("UNAVAILABLE")
+
+        # The site still reads the embedded participants, and entries made there only exist in it
+        joined = await self.boloes.update_one(
+            {"_id": bolao['_id'], "status": OPEN_BOLAO_STATUS, "participants.userId": {"$ne": user_id}},
+            {
+                "$inc": {"prizePool": entry_fee},
+                "$push": {"participants": participant}
+            },
+            session=session
+        )
+        if joined.matched_count == 0:
+            if session is None:
+                await self.bolao_entries.delete_one({"_id": entry.inserted_id})
+            raise EntryRejected("UNAVAILABLE")
+
+        await self.db.wallet_transactions.insert_one(ledger.ledger_entry(user_id, transaction), session=session)
 
-    def cog_unload(self):
-        self.client.close()
+    async def enter_bolao(self, bolao, participant: dict) -> str:
+        """Charges the entry fee and registers the guess. Returns OK, INSUFFICIENT_FUNDS or UNAVAILABLE."""
+        transaction = ledger.new_transaction(
+            "Aposta",
+            f"Entrada no Bolão: {bolao['homeTeam']} vs {bolao['awayTeam']}",
+            -bolao['entryFee']
+        )
+
+        if self.transactions_supported is not False:
+            try:
+                async with await self.client.start_session() as session:
+                    await session.with_transaction(
+                        lambda s: self.apply_entry(bolao, participant, transaction, session=s)
+                    )
+                self.transactions_supported = True
+                return "OK"
+            except EntryRejected as e:
+                return e.reason
+            except OperationFailure as e:
+                if e.code not in TRANSACTION_UNSUPPORTED_CODES:
+                    raise
+                print("MongoDB deployment doesn't support transactions. Using conditional updates for bolão entries.")
+                self.transactions_supported = False
+
+        # Without a transaction, a debit whose entry is rejected is refunded
+        try:
+            await self.apply_entry(bolao, participant, transaction)
+        except EntryRejected as e:
+            if e.reason == "UNAVAILABLE":
+                await self.wallets.update_one(
+                    {"userId": participant['userId']},
+                    {"$inc": {"balance": bolao['entryFee']}, "$pull": {"transactions": {"id": transaction['id']}}}
+                )
+            return e.reason
+        return "OK"
 
     @app_commands.command(name="bolao", description="🎫 Participe de um bolão usando o ID.")
     @app_commands.describe(id="O ID do bolão que você quer participar.")
@@ -109,7 +218,7 @@ class BolaoCog(commands.Cog, name="bolao"):
         user_id = str(interaction.user.id)
 
         # 1. Verifica se o usuário já fez login no site
-        if not get_user_data(user_id, self.db):
+        if not await self.user_cache.is_registered(user_id):
             site_url = os.getenv('SITE_URL', 'http://localhost:9003')
             embed = discord.Embed(
                 title="❌ Conta Não Encontrada",
@@ -126,8 +235,12 @@ class BolaoCog(commands.Cog, name="bolao"):
             await interaction.response.send_message("❌ ID do bolão inválido. Verifique o ID e tente novamente.", ephemeral=True)
             return
             
-        # 3. Procura pelo bolão no banco de dados
-        bolao = self.boloes.find_one({"_id": bolao_obj_id})
+        # 3. Procura pelo bolão, se o usuário já participou e o saldo dele, tudo de uma vez
+        bolao, existing_entry, user_wallet = await asyncio.gather(
+            self.boloes.find_one({"_id": bolao_obj_id}, BOLAO_PROJECTION),
+            self.bolao_entries.find_one({"bolaoId": bolao_obj_id, "userId": user_id}, {"_id": 1}),
+            self.wallets.find_one({"userId": user_id}, {"balance": 1})
+        )
         if not bolao:
             await interaction.response.send_message("❌ Bolão não encontrado com este ID.", ephemeral=True)
             return
@@ -138,21 +251,199 @@ class BolaoCog(commands.Cog, name="bolao"):
             return
 
         # 5. Verifica se o usuário já participou
-        if any(p['userId'] == user_id for p in bolao.get('participants', [])):
+        if existing_entry:
             await interaction.response.send_message("❌ Você já participou deste bolão.", ephemeral=True)
             return
             
         # 6. Verifica o saldo do usuário
-        user_wallet = self.wallets.find_one({"userId": user_id})
         entry_fee = bolao.get('entryFee', 5)
         if not user_wallet or user_wallet.get('balance', 0) < entry_fee:
             await interaction.response.send_message(f"❌ Saldo insuficiente. Você precisa de R$ {entry_fee:.2f} para participar.", ephemeral=True)
             return
 
         # 7. Se tudo estiver certo, abre o modal para o palpite
-        modal = ScoreModal(bolao, self.db)
+        modal = ScoreModal(bolao, self)
         await interaction.response.send_modal(modal)
 
+    async def settle_bolao(self, bolao_id: ObjectId, home: int, away: int) -> dict | None:
+        """Claims an open bolão with the final score and pays its winners.
+
+        Returns the settlement summary, or None when the bolão isn't open.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        # Moving the status off Aberto first means no one else can pay the same pool
+        bolao = await self.boloes.find_one_and_update(
+            {"_id": bolao_id, "status": OPEN_BOLAO_STATUS},
+            {"$set": {
+                "status": SETTLING_BOLAO_STATUS,
+                "settlement": {"finalScore": {"home": home, "away": away}, "startedAt": now}
+            }},
+            projection=SETTLEMENT_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        if not bolao:
+            return None
+        return await self.complete_settlement(bolao)
+
+    async def resume_settlement(self, bolao_id: ObjectId) -> dict | None:
+        """Finishes a settlement that stopped midway. Returns None when none is in progress."""
+        bolao = await self.boloes.find_one(
+            {"_id": bolao_id, "status": SETTLING_BOLAO_STATUS},
+            SETTLEMENT_PROJECTION
+        )
+        if not bolao:
+            return None
+        return await self.complete_settlement(bolao)
+
+    async def complete_settlement(self, bolao) -> dict:
+        """Scores every guess and pays all winners with one bulk write per collection.
+
+        The winners and their transaction ids are recorded on the bolão before any
+        money moves, and every write skips what was already applied, so running it
+        again after a failure pays each winner exactly once.
+        """
+        settlement = bolao['settlement']
+        final_score = settlement['finalScore']
+        participants = bolao.get('participants', [])
+
+        if 'winners' not in settlement:
+            winner_ids, exact = score_bolao(participants, final_score['home'], final_score['away'])
+            prize = split_prize(bolao.get('prizePool', 0), len(winner_ids))
+            settlement.update({
+                "exact": exact,
+                "prize": prize,
+                "winners": [{"userId": user_id, "transactionId": str(ObjectId())} for user_id in winner_ids]
+            })
+            await self.boloes.update_one(
+                {"_id": bolao['_id']},
+                {"$set": {
+                    "settlement.exact": exact,
+                    "settlement.prize": prize,
+                    "settlement.winners": settlement['winners']
+                }}
+            )
+
+        prize = settlement['prize']
+        winners = settlement['winners']
+        if winners and prize > 0:
+            # Wallets are credited before the ledger is written, so a payout already in the
+            # ledger was paid; the embedded-array filter below covers a stop in between
+            paid = await self.db.wallet_transactions.distinct(
+                "id", {"id": {"$in": [winner['transactionId'] for winner in winners]}}
+            )
+            wallet_updates = []
+            ledger_entries = []
+            for winner in winners:
+                transaction = {
+                    **ledger.new_transaction("Prêmio", f"Ganhos do Bolão: {bolao['homeTeam']} vs {bolao['awayTeam']}", prize),
+                    "id": winner['transactionId']
+                }
+                if transaction['id'] not in paid:
+                    wallet_updates.append(UpdateOne(
+                        {"userId": winner['userId'], "transactions.id": {"$ne": transaction['id']}},
+                        ledger.wallet_update(prize, transaction)
+                    ))
+                ledger_entries.append(UpdateOne(
+                    {"id": transaction['id']},
+                    {"$setOnInsert": ledger.ledger_entry(winner['userId'], transaction)},
+                    upsert=True
+                ))
+
+            if wallet_updates:
+                await self.wallets.bulk_write(wallet_updates, ordered=False)
+            await self.db.wallet_transactions.bulk_write(ledger_entries, ordered=False)
+
+            ranking_cog = self.bot.get_cog('Ranking')
+            if ranking_cog:
+                ranking_cog.invalidate('ricos')
+
+        await self.boloes.update_one(
+            {"_id": bolao['_id']},
+            {
+                "$set": {
+                    "status": "Pago",
+                    "finalScore": final_score,
+                    "winners": [{"userId": winner['userId'], "prize": prize} for winner in winners]
+                },
+                "$unset": {"settlement": ""}
+            }
+        )
+
+        return {
+            "bolao": bolao,
+            "finalScore": final_score,
+            "participants": len(participants),
+            "winners": [winner['userId'] for winner in winners],
+            "exact": settlement['exact'],
+            "prize": prize,
+        }
+
+    def settlement_embed(self, result: dict) -> discord.Embed:
+        bolao = result['bolao']
+        if not result['winners']:
+            description = "Nenhum palpite válido foi registrado neste bolão."
+        elif result['exact']:
+            description = f"**{len(result['winners'])}** participante(s) acertaram o placar e ganharam **R$ {result['prize']:.2f}** cada."
+        else:
+            description = f"Ninguém acertou o placar. Os **{len(result['winners'])}** palpite(s) mais próximos ganharam **R$ {result['prize']:.2f}** cada."
+
+        final_score = result['finalScore']
+        embed = discord.Embed(
+            title=f"🏁 Bolão Apurado: {bolao['homeTeam']} {final_score['home']} x {final_score['away']} {bolao['awayTeam']}",
+            description=description,
+            color=0x00FF00
+        )
+        embed.set_footer(text=f"{result['participants']} participante(s)")
+        return embed
+
+    @app_commands.command(name="apurar_bolao", description="[Admin] Apura um bolão com o placar final e paga os vencedores.")
+    @app_commands.describe(id="O ID do bolão.", casa="Gols do time da casa.", fora="Gols do time visitante.")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def apurar_bolao(self, interaction: discord.Interaction, id: str, casa: app_commands.Range[int, 0, 99], fora: app_commands.Range[int, 0, 99]):
+        await interaction.response.defer(ephemeral=True)
+
+        try:
+            bolao_obj_id = ObjectId(id)
+        except Exception:
+            await interaction.followup.send("❌ ID do bolão inválido. Verifique o ID e tente novamente.", ephemeral=True)
+            return
+
+        result = await self.settle_bolao(bolao_obj_id, casa, fora)
+        if result is None:
+            await interaction.followup.send("❌ Bolão não encontrado, já apurado ou sendo apurado agora. Se uma apuração foi interrompida, use `/retomar_apuracao`.", ephemeral=True)
+            return
+
+        await interaction.followup.send(embed=self.settlement_embed(result), ephemeral=True)
+
+    @app_commands.command(name="retomar_apuracao", description="[Admin] Conclui a apuração de um bolão que foi interrompida.")
+    @app_commands.describe(id="O ID do bolão.")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def retomar_apuracao(self, interaction: discord.Interaction, id: str):
+        await interaction.response.defer(ephemeral=True)
+
+        try:
+            bolao_obj_id = ObjectId(id)
+        except Exception:
+            await interaction.followup.send("❌ ID do bolão inválido. Verifique o ID e tente novamente.", ephemeral=True)
+            return
+
+        result = await self.resume_settlement(bolao_obj_id)
+        if result is None:
+            await interaction.followup.send("❌ Não há apuração em andamento para este bolão.", ephemeral=True)
+            return
+
+        await interaction.followup.send(embed=self.settlement_embed(result), ephemeral=True)
+
+    @apurar_bolao.error
+    @retomar_apuracao.error
+    async def on_apurar_bolao_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        if isinstance(error, app_commands.MissingPermissions):
+            await interaction.response.send_message("Você não tem permissão para usar este comando.", ephemeral=True)
+        else:
+            # The bolão stays Apurando with its recorded winners; /retomar_apuracao pays whoever is missing
+            print(f"Erro ao apurar o bolão: {error}")
+            await interaction.followup.send(f"Ocorreu um erro ao apurar o bolão: {error}\nUse `/retomar_apuracao` para concluir.", ephemeral=True)
+
 
 async def setup(bot):
     await bot.add_cog(BolaoCog(bot))
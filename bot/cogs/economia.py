@@ -3,14 +3,21 @@ from discord.ext import commands
 from discord import app_commands
 import datetime
 import os
-from pymongo import MongoClient
+import asyncio
 from dotenv import load_dotenv
+from utils.database import get_client
+from utils.user_cache import get_user_cache
 
 load_dotenv()
 
+# Fields each command actually renders
+SALDO_WALLET_PROJECTION = {"_id": 0, "balance": 1, "transactions": {"$slice": 3}}
+PERFIL_USER_PROJECTION = {"_id": 1, "level": 1, "xp": 1}
+PERFIL_STATS_PROJECTION = {"_id": 0, "totalBets": 1, "betsWon": 1, "betsLost": 1, "totalWagered": 1, "totalWinnings": 1}
+
 # Helper function to check for user existence
-def get_user_data(user_id, db):
-    user = db.users.find_one({"discordId": user_id})
+async def get_user_data(user_id, db, projection=None):
+    user = await db.users.find_one({"discordId": user_id}, projection or {"_id": 1})
     if not user:
         return None
     return user
@@ -22,22 +29,24 @@ def format_currency(value):
 class Economia(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.client = MongoClient(os.getenv('MONGODB_URI'))
+        self.client = get_client(bot)
         self.db = self.client.timaocord
         self.wallets = self.db.wallets
         self.users = self.db.users
         self.user_stats = self.db.user_stats
+        self.user_cache = get_user_cache(bot)
 
-    def cog_unload(self):
-        self.client.close()
-        
     @app_commands.command(name="saldo", description="💰 Verificar seu saldo atual e últimas transações.")
     async def saldo(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
         user_id = str(interaction.user.id)
         
-        user_doc = get_user_data(user_id, self.db)
-        if not user_doc:
+        # Existence check (usually answered from memory) and wallet read run concurrently
+        is_registered, user_wallet = await asyncio.gather(
+            self.user_cache.is_registered(user_id),
+            self.wallets.find_one({"userId": user_id}, SALDO_WALLET_PROJECTION)
+        )
+        if not is_registered:
             site_url = os.getenv('SITE_URL', 'http://localhost:9003')
             embed = discord.Embed(
                 title="❌ Conta Não Encontrada",
@@ -47,7 +56,6 @@ class Economia(commands.Cog):
             await interaction.followup.send(embed=embed)
             return
 
-        user_wallet = self.wallets.find_one({"userId": user_id})
         balance = user_wallet.get("balance", 0.0) if user_wallet else 0.0
         
         embed = discord.Embed(
@@ -84,7 +92,11 @@ class Economia(commands.Cog):
         target_user = usuario or interaction.user
         user_id = str(target_user.id)
 
-        user_doc = get_user_data(user_id, self.db)
+        user_doc, stats = await asyncio.gather(
+            get_user_data(user_id, self.db, PERFIL_USER_PROJECTION),
+            self.user_stats.find_one({"userId": user_id}, PERFIL_STATS_PROJECTION)
+        )
+        self.user_cache.remember(user_id, user_doc is not None)
         if not user_doc:
             site_url = os.getenv('SITE_URL', 'http://localhost:9003')
             is_self = target_user.id == interaction.user.id
@@ -102,7 +114,7 @@ class Economia(commands.Cog):
             await interaction.followup.send(embed=embed, ephemeral=True)
             return
             
-        stats = self.user_stats.find_one({"userId": user_id}) or {}
+        stats = stats or {}
 
         level = user_doc.get('level', 1)
         xp = user_doc.get('xp', 0)
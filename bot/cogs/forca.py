@@ -2,14 +2,13 @@
 import discord
 from discord.ext import commands
 from discord import app_commands, ui
-import os
-from pymongo import MongoClient
 from dotenv import load_dotenv
+from utils.database import get_client
+from utils import ledger
 from bson.objectid import ObjectId
 import asyncio
 import unicodedata
 import re
-import datetime
 import random
 from collections import defaultdict
 
@@ -178,7 +177,7 @@ class ForcaGameView(ui.View):
 class Forca(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.client = MongoClient(os.getenv('MONGODB_URI'))
+        self.client = get_client(bot)
         self.db = self.client.timaocord
         self.bot_db = self.client.timaocord_bot
         self.users_collection = self.db.users
@@ -193,7 +192,6 @@ class Forca(commands.Cog):
                 game.view.stop()
             if game.hint_task:
                 game.hint_task.cancel()
-        self.client.close()
 
     async def end_game_session(self, game: ForcaGame, reason="Obrigado por jogar!"):
         if game.channel.id in self.active_games:
@@ -232,24 +230,18 @@ class Forca(commands.Cog):
         prize = game.prize_per_round
         user_id_str = str(interaction.user.id)
 
-        new_transaction = {
-            "id": str(ObjectId()), "type": "Prêmio",
-            "description": f"Prêmio do jogo da Forca",
-            "amount": prize,
-            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
-            "status": "Concluído"
-        }
-        self.wallets_collection.update_one(
-            {"userId": user_id_str},
-            {"$inc": {"balance": prize}, "$push": {"transactions": {"$each": [new_transaction], "$sort": {"date": -1}}}},
-            upsert=True
-        )
+        new_transaction = ledger.new_transaction("Prêmio", "Prêmio do jogo da Forca", prize)
+        await ledger.record_transaction(self.db, user_id_str, prize, new_transaction)
 
-        self.users_collection.update_one(
+        await self.users_collection.update_one(
             {"discordId": user_id_str},
             {"$addToSet": {"unlockedAchievements": "win_forca"}}
         )
 
+        ranking_cog = self.bot.get_cog('Ranking')
+        if ranking_cog:
+            ranking_cog.invalidate('ricos')
+
         embed = game.get_game_embed(
             title_override=f"🏆 {interaction.user.display_name} acertou!",
             description_override=f"Parabéns! A palavra era **{game.current_word}**. Você ganhou **R$ {prize:.2f}**!",
@@ -308,7 +300,7 @@ class Forca(commands.Cog):
             return
 
         words_cursor = self.words_collection.aggregate([{"$sample": {"size": 3}}])
-        words = list(words_cursor)
+        words = await words_cursor.to_list(length=3)
         if len(words) < 3:
             await channel.send("❌ Não há palavras suficientes no banco de dados para iniciar (mínimo 3).", delete_after=10)
             return
@@ -322,7 +314,7 @@ class Forca(commands.Cog):
         await self.start_new_round_or_end_game(game)
     
     async def run_scheduled_game(self):
-        config_doc = self.bot_config_collection.find_one({"_id": ObjectId('669fdb5a907548817b848c48')})
+        config_doc = await self.bot_config_collection.find_one({"_id": ObjectId('669fdb5a907548817b848c48')})
         if not config_doc or not config_doc.get('forcaChannelId'):
             print("Forca schedule error: Forca Channel ID is not configured.")
             return
@@ -7,6 +7,14 @@ class General(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
 
+    def public_commands(self, cog_commands):
+        """Yields plain commands and the subcommands of groups open to everyone."""
+        for cmd in cog_commands:
+            if isinstance(cmd, app_commands.Command):
+                yield cmd
+            elif isinstance(cmd, app_commands.Group) and cmd.default_permissions is None:
+                yield from (sub for sub in cmd.commands if isinstance(sub, app_commands.Command))
+
     @app_commands.command(name="ajuda", description="❓ Mostra todos os comandos disponíveis.")
     async def ajuda(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
@@ -28,7 +36,7 @@ class General(commands.Cog):
         for cog_name, cog_commands in cogs.items():
             # Don't show internal tasks or event listeners that have no user-facing commands
             if cog_commands and cog_name not in ["Tasks", "Leveling"]:
-                command_list = sorted([f"`/{cmd.name}`: {cmd.description}" for cmd in cog_commands if isinstance(cmd, app_commands.Command)])
+                command_list = sorted([f"`/{cmd.qualified_name}`: {cmd.description}" for cmd in self.public_commands(cog_commands)])
                 if command_list:
                     cog_display_name = cog_name.replace("Cog", "") # Make name cleaner
                     embed.add_field(name=f"**{cog_display_name}**", value="\n".join(command_list), inline=False)
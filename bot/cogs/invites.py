@@ -1,27 +1,126 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import os
-from pymongo import MongoClient
+from pymongo import UpdateOne, ReturnDocument
 from dotenv import load_dotenv
+from utils.database import get_client
+from utils.user_cache import get_user_cache
 import datetime
-from collections import defaultdict
+import asyncio
+import time
+from collections import Counter, defaultdict
 
 load_dotenv()
 
+# Joins arriving within this many seconds are attributed with a single invites fetch
+JOIN_WINDOW_SECONDS = 3
+# Guilds whose invites are fetched at the same time during warm-up
+WARMUP_CONCURRENCY = 5
+# Inviters shown by /convites ranking
+RANKING_LIMIT = 10
+
+# Rebuilds invite_counters from history: each invite counts as left when the
+# invitee's latest activity in that guild is a leave. Prefixed with a $match on
+# the cutoff by backfill_invite_counters.
+COUNTERS_BACKFILL_PIPELINE = [
+    {"$lookup": {
+        "from": "member_activity",
+        "let": {"guildId": "$guildId", "userId": "$inviteeId"},
+        "pipeline": [
+            {"$match": {"$expr": {"$and": [
+                {"$eq": ["$guildId", "$$guildId"]},
+                {"$eq": ["$userId", "$$userId"]}
+            ]}}},
+            {"$sort": {"timestamp": -1}},
+            {"$limit": 1},
+            {"$project": {"_id": 0, "type": 1}}
+        ],
+        "as": "lastActivity"
+    }},
+    {"$group": {
+        "_id": "$inviterId",
+        "total": {"$sum": 1},
+        # Invites already flagged left were decremented by on_member_remove itself
+        "left": {"$sum": {"$cond": [
+            {"$and": [{"$in": ["leave", "$lastActivity.type"]}, {"$ne": ["$left", True]}]}, 1, 0
+        ]}}
+    }}
+]
+
 class Invites(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.client = MongoClient(os.getenv('MONGODB_URI'))
+        self.client = get_client(bot)
         self.db = self.client.timaocord
         self.invites_collection = self.db.invites
         self.users_collection = self.db.users
         self.member_activity_collection = self.db.member_activity
+        # Per-inviter counts: {_id: inviterId, total, left, net}
+        self.invite_counters_collection = self.db.invite_counters
+        self.user_cache = get_user_cache(bot)
         # Cache for guild invites: {guild_id: {invite_code: uses}}
         self.invite_cache = defaultdict(dict)
+        # Joins waiting for attribution: {guild_id: [(member, joined_at)]}
+        self.pending_joins = defaultdict(list)
+        self.join_window_tasks = {} # Stores guild_id: task processing the current window
+        # Joins whose events are recorded but whose inviter isn't known yet: {guild_id: [(member, joined_at)]}
+        self.unattributed_joins = defaultdict(list)
+        # One attribution pass per guild at a time, so each invites fetch is diffed against the last one
+        self.attribution_locks = defaultdict(asyncio.Lock)
+        # Set once the invite cache is warm; joins before that wait in pending_joins
+        self.invite_cache_ready = asyncio.Event()
+
+    async def cog_load(self):
+        # on_ready doesn't fire again when the cog is (re)loaded into a running bot
+        self.warmup_task = None
+        if self.bot.is_ready():
+            self.warmup_task = asyncio.create_task(self.warm_invite_cache())
+
+        # Listeners start after cog_load, so every invite this instance counts itself is
+        # recorded after the cutoff and the backfill only covers invites before it
+        cutoff = datetime.datetime.now(datetime.timezone.utc)
+        self.backfill_task = None
+        try:
+            if await self.invite_counters_collection.count_documents({}, limit=1) == 0:
+                self.backfill_task = asyncio.create_task(self.backfill_invite_counters(cutoff))
+        except Exception as e:
+            print(f"Error checking invite counters: {e}")
 
     def cog_unload(self):
-        self.client.close()
+        for task in self.join_window_tasks.values():
+            task.cancel()
+        if self.backfill_task:
+            self.backfill_task.cancel()
+        if self.warmup_task:
+            self.warmup_task.cancel()
+
+    async def backfill_invite_counters(self, cutoff: datetime.datetime):
+        """Builds the counters from the invites recorded before `cutoff`."""
+        try:
+            pipeline = [{"$match": {"timestamp": {"$lt": cutoff}}}, *COUNTERS_BACKFILL_PIPELINE]
+            totals = await self.invites_collection.aggregate(pipeline).to_list(length=None)
+            if not totals:
+                return
+
+            # $inc adds to the counts of invites recorded after the cutoff
+            await self.invite_counters_collection.bulk_write([
+                UpdateOne(
+                    {"_id": row["_id"]},
+                    {"$inc": {"total": row["total"], "left": row["left"], "net": row["total"] - row["left"]}},
+                    upsert=True
+                )
+                for row in totals
+            ], ordered=False)
+            print(f"Backfilled invite counters for {len(totals)} inviters.")
+        except Exception as e:
+            print(f"Error backfilling invite counters: {e}")
+
+    async def increment_invite_counters(self, per_inviter: dict):
+        """Adds {inviterId: joins} to each inviter's total and net counts."""
+        await self.invite_counters_collection.bulk_write([
+            UpdateOne({"_id": inviter_id}, {"$inc": {"total": count, "net": count}}, upsert=True)
+            for inviter_id, count in per_inviter.items()
+        ], ordered=False)
 
     async def sync_invites(self, guild: discord.Guild):
         """Syncs the invite cache for a specific guild."""
@@ -35,10 +134,21 @@ class Invites(commands.Cog):
 
     @commands.Cog.listener()
     async def on_ready(self):
+        await self.warm_invite_cache()
+
+    async def warm_invite_cache(self):
         print("Invite tracker is ready. Caching invites for all guilds...")
-        for guild in self.bot.guilds:
-            await self.sync_invites(guild)
-        print("Invite cache populated.")
+        started = time.perf_counter()
+
+        # Bounded so a bot in many guilds stays within Discord's rate limits
+        semaphore = asyncio.Semaphore(WARMUP_CONCURRENCY)
+        async def sync_with_limit(guild: discord.Guild):
+            async with semaphore:
+                await self.sync_invites(guild)
+
+        await asyncio.gather(*(sync_with_limit(guild) for guild in self.bot.guilds))
+        self.invite_cache_ready.set()
+        print(f"Invite cache populated for {len(self.bot.guilds)} guilds in {time.perf_counter() - started:.2f}s.")
 
     @commands.Cog.listener()
     async def on_guild_join(self, guild: discord.Guild):
@@ -50,70 +160,143 @@ class Invites(commands.Cog):
         if member.bot:
             return
 
-        # Record join event
-        self.member_activity_collection.insert_one({
-            "guildId": str(member.guild.id),
-            "userId": str(member.id),
-            "type": "join",
-            "timestamp": datetime.datetime.now(datetime.timezone.utc)
-        })
+        guild_id = member.guild.id
+        self.pending_joins[guild_id].append((member, datetime.datetime.now(datetime.timezone.utc)))
+
+        # The first join of a window schedules one attribution pass for everyone joining in it
+        if guild_id not in self.join_window_tasks:
+            self.join_window_tasks[guild_id] = asyncio.create_task(self.process_join_window(member.guild))
+
+    async def process_join_window(self, guild: discord.Guild):
+        """Records the window's join events, then attributes every join still pending in the guild."""
+        await asyncio.sleep(JOIN_WINDOW_SECONDS)
+        del self.join_window_tasks[guild.id]
+        joins = self.pending_joins.pop(guild.id, [])
+        if not joins:
+            return
 
+        # Record join events
         try:
-            # 1. Get the current invites for the guild
-            current_invites = await member.guild.invites()
-            
-            # 2. Get the cached invites
-            cached_invites = self.invite_cache.get(member.guild.id, {})
-            
-            # 3. Find the invite that was used
-            used_invite = None
+            await self.member_activity_collection.insert_many([
+                {
+                    "guildId": str(guild.id),
+                    "userId": str(member.id),
+                    "type": "join",
+                    "timestamp": joined_at
+                }
+                for member, joined_at in joins
+            ])
+        except Exception as e:
+            print(f"Error recording {len(joins)} join events in guild {guild.id}: {e}")
+
+        self.unattributed_joins[guild.id].extend(joins)
+
+        # Diffing against a cold cache would misattribute, so wait for the warm-up
+        if not self.invite_cache_ready.is_set():
+            print(f"Invite cache still warming up. Holding joins in {guild.name}.")
+            await self.invite_cache_ready.wait()
+
+        async with self.attribution_locks[guild.id]:
+            # Windows that waited behind another pass find their joins already attributed by it
+            joins = self.unattributed_joins.pop(guild.id, [])
+            if joins:
+                await self.attribute_joins(guild, joins)
+
+    async def attribute_joins(self, guild: discord.Guild, joins: list):
+        """Pairs the joins with the invite uses added since the last pass. Runs under the guild's lock."""
+        try:
+            # 1. Get the current invites for the guild, once for every pending join
+            current_invites = await guild.invites()
+
+            # 2. Diff against the cached invites: each extra use is one join to attribute
+            cached_invites = self.invite_cache[guild.id]
+            used_invites = []
             for invite in current_invites:
-                # If the invite is new or its use count has increased
-                if invite.code not in cached_invites or invite.uses > cached_invites.get(invite.code, 0):
-                    used_invite = invite
+                new_uses = invite.uses - cached_invites.get(invite.code, 0)
+                used_invites.extend([invite] * min(max(new_uses, 0), len(joins) - len(used_invites)))
+                if len(used_invites) >= len(joins):
                     break
 
-            # 4. If we found the used invite, record it
-            if used_invite and used_invite.inviter:
+            # 3. Advance the cache only by the uses assigned here; uses left over belong to
+            # joins whose events haven't arrived yet and are paired by the next pass
+            for invite in used_invites:
+                cached_invites[invite.code] = cached_invites.get(invite.code, 0) + 1
+
+            # 4. The uses only tell how many joins each invite brought, not which member used
+            # which invite, so count them per inviter first
+            invites_by_code = {invite.code: invite for invite in used_invites}
+            uses_per_invite = Counter(invite.code for invite in used_invites)
+            per_inviter = defaultdict(int)
+            for code, uses in uses_per_invite.items():
+                inviter = invites_by_code[code].inviter
+                if not inviter:
+                    continue
+
                 # Check if inviter is a registered user on the website
-                inviter_id = str(used_invite.inviter.id)
-                if not self.users_collection.find_one({"discordId": inviter_id}):
+                inviter_id = str(inviter.id)
+                if not await self.user_cache.is_registered(inviter_id):
                     print(f"Inviter {inviter_id} is not registered on the site. Skipping invite record.")
-                    # Update cache regardless
-                    await self.sync_invites(member.guild)
-                    return
-
-                # Record the successful invite
-                self.invites_collection.insert_one({
-                    "guildId": str(member.guild.id),
-                    "inviterId": inviter_id,
-                    "inviteeId": str(member.id),
-                    "timestamp": datetime.datetime.now(datetime.timezone.utc)
-                })
-                print(f"{member.name} joined using an invite from {used_invite.inviter.name}")
-            else:
-                print(f"Could not determine the inviter for {member.name}. They might have used a vanity URL or an expired link.")
-                
-            # 5. Update the cache with the new invite uses
-            await self.sync_invites(member.guild)
+                    continue
+                per_inviter[inviter_id] += uses
+
+            # 5. Who invited whom is only known when every join came through the same invite;
+            # otherwise just the counters move, and on_member_remove has no record to decrement
+            records = []
+            if len(uses_per_invite) == 1 and len(used_invites) == len(joins) and per_inviter:
+                inviter_id = next(iter(per_inviter))
+                records = [
+                    {
+                        "guildId": str(guild.id),
+                        "inviterId": inviter_id,
+                        "inviteeId": str(member.id),
+                        "timestamp": joined_at
+                    }
+                    for member, joined_at in joins
+                ]
+            elif per_inviter:
+                print(f"{len(used_invites)} joins in {guild.name} used {len(uses_per_invite)} invites. Counting them without recording who invited whom.")
+
+            if records:
+                await self.invites_collection.insert_many(records)
+            if per_inviter:
+                await self.increment_invite_counters(per_inviter)
+
+            unattributed = len(joins) - len(used_invites)
+            print(f"Attributed {sum(per_inviter.values())} of {len(joins)} joins in {guild.name}.")
+            if unattributed:
+                print(f"Could not determine the inviter for {unattributed} joins. They might have used a vanity URL or an expired link.")
 
         except discord.Forbidden:
-            print(f"Cannot track invites in {member.guild.name} due to missing permissions.")
+            print(f"Cannot track invites in {guild.name} due to missing permissions.")
         except Exception as e:
-            print(f"An error occurred in on_member_join: {e}")
+            print(f"An error occurred while attributing joins in {guild.name}: {e}")
 
     @commands.Cog.listener()
     async def on_member_remove(self, member: discord.Member):
         if member.bot:
             return
         
-        self.member_activity_collection.insert_one({
+        await self.member_activity_collection.insert_one({
             "guildId": str(member.guild.id),
             "userId": str(member.id),
             "type": "leave",
             "timestamp": datetime.datetime.now(datetime.timezone.utc)
         })
 
+        # Flagging the invite first means each invitee lowers the inviter's net count only once
+        invite_record = await self.invites_collection.find_one_and_update(
+            {"guildId": str(member.guild.id), "inviteeId": str(member.id), "left": {"$ne": True}},
+            {"$set": {"left": True}},
+            sort=[("timestamp", -1)],
+            projection={"inviterId": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if invite_record:
+            await self.invite_counters_collection.update_one(
+                {"_id": invite_record["inviterId"]},
+                {"$inc": {"left": 1, "net": -1}}
+            )
+
     @commands.Cog.listener()
     async def on_invite_create(self, invite: discord.Invite):
         """Updates cache when a new invite is created."""
@@ -126,22 +309,44 @@ class Invites(commands.Cog):
         if invite.guild and invite.code in self.invite_cache.get(invite.guild.id, {}):
             del self.invite_cache[invite.guild.id][invite.code]
 
-    @app_commands.command(name="convites", description="🤝 Veja quantos membros você já convidou para o servidor.")
+    convites_group = app_commands.Group(name="convites", description="🤝 Convites para o servidor.")
+
+    @convites_group.command(name="meus", description="🤝 Veja quantos membros você já convidou para o servidor.")
     async def meus_convites(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
         user_id = str(interaction.user.id)
         
-        invite_count = self.invites_collection.count_documents({"inviterId": user_id})
+        counters = await self.invite_counters_collection.find_one({"_id": user_id}) or {}
+        invite_count = counters.get("total", 0)
+        net_count = counters.get("net", 0)
 
         embed = discord.Embed(
             title="🤝 Meus Convites",
-            description=f"Você convidou um total de **{invite_count}** membro(s) para o servidor!",
+            description=f"Você convidou um total de **{invite_count}** membro(s) para o servidor!\n**{net_count}** deles continuam no servidor.",
             color=0x1E90FF
         )
         embed.set_author(name=interaction.user.display_name, icon_url=interaction.user.display_avatar.url)
         embed.set_footer(text="Continue convidando para ganhar recompensas!")
         await interaction.followup.send(embed=embed)
 
+    @convites_group.command(name="ranking", description="🏆 Veja quem mais trouxe membros para o servidor.")
+    async def ranking_convites(self, interaction: discord.Interaction):
+        await interaction.response.defer()
+
+        top_inviters = await self.invite_counters_collection.find(
+            {"net": {"$gt": 0}}
+        ).sort([("net", -1), ("total", -1)]).limit(RANKING_LIMIT).to_list(length=RANKING_LIMIT)
+
+        embed = discord.Embed(title="🏆 Ranking de Convites", color=0x1E90FF)
+        if not top_inviters:
+            embed.description = "Ninguém convidou membros ainda. Seja o primeiro!"
+        else:
+            embed.description = "\n".join(
+                f"**{i + 1}º:** <@{entry['_id']}> - {entry['net']} membro(s) ({entry.get('total', 0)} convidado(s))"
+                for i, entry in enumerate(top_inviters)
+            )
+        embed.set_footer(text="Contam apenas os convidados que continuam no servidor.")
+        await interaction.followup.send(embed=embed)
 
 async def setup(bot):
     await bot.add_cog(Invites(bot))
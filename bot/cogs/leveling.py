@@ -1,65 +1,160 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
 import datetime
-import os
-from pymongo import MongoClient
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 from bson.objectid import ObjectId
 from dotenv import load_dotenv
+from utils.database import get_client
+from utils.cooldowns import CooldownStore
+from utils.bot_config import get_config_provider
+import asyncio
+import bisect
 import random
 import time
+from collections import defaultdict
 
 load_dotenv()
 
-# Fixed IDs for config documents
+# Fixed ID for the level config document
 LEVEL_CONFIG_ID = ObjectId('66a500a8a7c3d2e3c4f5b6a8')
-BOT_CONFIG_ID = ObjectId('669fdb5a907548817b848c48')
+
+class LevelIndex:
+    """Level config compiled into parallel arrays for O(log n) lookups."""
+
+    def __init__(self, levels: list):
+        self.levels = sorted(levels, key=lambda x: x['level'])
+        self.level_numbers = [level_info['level'] for level_info in self.levels]
+        # Running max keeps the thresholds sorted even if the config lists a
+        # lower XP requirement for a higher level.
+        self.thresholds = []
+        highest = None
+        for level_info in self.levels:
+            highest = level_info['xp'] if highest is None else max(highest, level_info['xp'])
+            self.thresholds.append(highest)
+
+    def __len__(self):
+        return len(self.levels)
+
+    def levels_crossed(self, current_level: int, xp: int) -> list:
+        """Returns every level above `current_level` reached with `xp`, lowest first."""
+        start = bisect.bisect_right(self.level_numbers, current_level)
+        end = bisect.bisect_right(self.thresholds, xp)
+        return self.levels[start:end]
 
 class Leveling(commands.Cog):
     def __init__(self, bot):
         self.bot: commands.Bot = bot
-        self.client = MongoClient(os.getenv('MONGODB_URI'))
+        self.client = get_client(bot)
         self.db = self.client.timaocord
-        self.bot_db = self.client.timaocord_bot
         self.users = self.db.users
         self.wallets = self.db.wallets
         self.level_config_collection = self.db.level_config
-        self.bot_config_collection = self.bot_db.config
+        self.config_provider = get_config_provider(bot)
         
-        # Simple in-memory caches to replace cachetools
-        self.message_cooldowns = {}  # Stores user_id: timestamp
-        self.level_config_cache = {} # Stores 'config': (timestamp, data)
-        self.bot_config_cache = {}   # Stores 'config': (timestamp, data)
         self.MESSAGE_COOLDOWN_SECONDS = 60
         self.CONFIG_CACHE_SECONDS = 900 # 15 minutes
 
-    def cog_unload(self):
-        self.client.close()
+        # Simple in-memory caches to replace cachetools
+        self.message_cooldowns = CooldownStore(self.MESSAGE_COOLDOWN_SECONDS) # Expiring user IDs
+        self.level_config_cache = {} # Stores 'config': (timestamp, LevelIndex)
+
+        # Write-behind XP: increments are coalesced here and flushed in bulk
+        self.pending_xp = defaultdict(int) # Stores user_id: XP not yet written
+        self.pending_levels = {}           # Stores user_id: level not yet written
+        self.xp_state = {}                 # Stores user_id: (xp, level, loaded_at)
+        self.XP_STATE_SECONDS = 300 # Re-read totals from the DB after 5 minutes
+        self.flush_lock = asyncio.Lock()
+        self.flush_xp_loop.start()
 
-    async def get_level_config(self):
-        """Fetches level configuration from cache or database."""
+    async def cog_unload(self):
+        self.flush_xp_loop.cancel()
+        await self.flush_xp()
+
+    async def get_level_config(self) -> LevelIndex:
+        """Fetches the compiled level configuration from cache or database."""
         cached = self.level_config_cache.get('config')
         if cached and (time.time() - cached[0]) < self.CONFIG_CACHE_SECONDS:
             return cached[1]
         
-        config_doc = self.level_config_collection.find_one({"_id": LEVEL_CONFIG_ID})
+        config_doc = await self.level_config_collection.find_one({"_id": LEVEL_CONFIG_ID})
         if config_doc and 'levels' in config_doc:
-            config = sorted(config_doc['levels'], key=lambda x: x['level'])
+            config = LevelIndex(config_doc['levels'])
             self.level_config_cache['config'] = (time.time(), config)
             return config
-        return []
+        return LevelIndex([])
     
     async def get_bot_config(self):
-        """Fetches bot configuration from cache or database."""
-        cached = self.bot_config_cache.get('config')
-        if cached and (time.time() - cached[0]) < self.CONFIG_CACHE_SECONDS:
-            return cached[1]
-        
-        config_doc = self.bot_config_collection.find_one({"_id": BOT_CONFIG_ID})
-        if config_doc:
-            self.bot_config_cache['config'] = (time.time(), config_doc)
-            return config_doc
-        return {}
+        """Fetches bot configuration from the shared provider."""
+        return await self.config_provider.get()
+
+    async def get_xp_state(self, user_id: str):
+        """Returns the locally tracked (xp, level) of a user, loading it once from the database."""
+        state = self.xp_state.get(user_id)
+        if state:
+            return state[0], state[1]
+
+        user_doc = await self.users.find_one({"discordId": user_id}, {"xp": 1, "level": 1}) or {}
+        state = self.xp_state.get(user_id) # Another grant may have loaded it meanwhile
+        if state:
+            return state[0], state[1]
+
+        # Increments still waiting for a flush are not in the database yet
+        xp = user_doc.get('xp', 0) + self.pending_xp.get(user_id, 0)
+        level = self.pending_levels.get(user_id, user_doc.get('level', 1))
+        self.xp_state[user_id] = (xp, level, time.time())
+        return xp, level
+
+    async def flush_xp(self):
+        """Writes all accumulated XP increments and level changes with a single bulk_write."""
+        async with self.flush_lock:
+            if not self.pending_xp and not self.pending_levels:
+                return
+
+            pending_xp, self.pending_xp = self.pending_xp, defaultdict(int)
+            pending_levels, self.pending_levels = self.pending_levels, {}
+
+            user_ids = list(pending_xp.keys() | pending_levels.keys())
+            operations = []
+            for user_id in user_ids:
+                update = {"$inc": {"xp": pending_xp.get(user_id, 0)}}
+                if user_id in pending_levels:
+                    update["$set"] = {"level": pending_levels[user_id]}
+                operations.append(UpdateOne({"discordId": user_id}, update, upsert=True))
+
+            failed_user_ids = []
+            try:
+                await self.users.bulk_write(operations, ordered=False)
+                ranking_cog = self.bot.get_cog('Ranking')
+                if ranking_cog:
+                    ranking_cog.invalidate('niveis')
+            except BulkWriteError as e:
+                failed_user_ids = [user_ids[error['index']] for error in e.details.get('writeErrors', [])]
+                print(f"Error flushing XP for {len(failed_user_ids)} of {len(user_ids)} users.")
+            except Exception as e:
+                failed_user_ids = user_ids
+                print(f"Error flushing XP for {len(user_ids)} users: {e}")
+
+            # Re-queue anything that did not reach the database so the next flush retries it
+            for user_id in failed_user_ids:
+                self.pending_xp[user_id] += pending_xp.get(user_id, 0)
+                if user_id in pending_levels:
+                    self.pending_levels.setdefault(user_id, pending_levels[user_id])
+
+            # Drop old local totals of users with nothing pending so edits made on the site are picked up
+            now = time.time()
+            stale_user_ids = [
+                user_id for user_id, state in self.xp_state.items()
+                if (now - state[2]) >= self.XP_STATE_SECONDS
+                and user_id not in self.pending_xp and user_id not in self.pending_levels
+            ]
+            for user_id in stale_user_ids:
+                del self.xp_state[user_id]
+
+    @tasks.loop(seconds=5.0)
+    async def flush_xp_loop(self):
+        await self.flush_xp()
 
     async def grant_xp(self, user: discord.Member, amount: int, channel: discord.TextChannel):
         """Grants XP to a user, checks for level ups, and handles rewards."""
@@ -68,29 +163,25 @@ class Leveling(commands.Cog):
 
         user_id = str(user.id)
         
-        user_doc = self.users.find_one_and_update(
-            {"discordId": user_id},
-            {"$inc": {"xp": amount}},
-            upsert=True,
-            return_document=True
-        )
+        current_xp, current_level = await self.get_xp_state(user_id)
+        new_xp = current_xp + amount
 
-        current_level = user_doc.get('level', 1)
-        new_xp = user_doc.get('xp', 0) + amount
+        # The database write is deferred to the next flush
+        self.pending_xp[user_id] += amount
+        self.xp_state[user_id] = (new_xp, current_level, self.xp_state[user_id][2])
 
         level_config = await self.get_level_config()
         if not level_config:
             return
 
-        new_level_data = None
-        for level_info in reversed(level_config):
-            if new_xp >= level_info['xp']:
-                new_level_data = level_info
-                break
+        # Every level reached by this grant, so multi-level jumps pay all rewards
+        levels_crossed = level_config.levels_crossed(current_level, new_xp)
         
-        if new_level_data and new_level_data['level'] > current_level:
+        if levels_crossed:
             # User leveled up!
-            self.users.update_one({"discordId": user_id}, {"$set": {"level": new_level_data['level']}})
+            new_level_data = levels_crossed[-1]
+            self.pending_levels[user_id] = new_level_data['level']
+            self.xp_state[user_id] = (new_xp, new_level_data['level'], time.time())
             
             level_up_embed = discord.Embed(
                 title="🎉 Level Up!",
@@ -99,37 +190,46 @@ class Leveling(commands.Cog):
             )
             level_up_embed.set_thumbnail(url=user.display_avatar.url)
 
-            # Handle rewards
-            reward_description = ""
-            reward_type = new_level_data.get('rewardType')
-            if reward_type == 'money':
-                reward_amount = new_level_data.get('rewardAmount', 0)
-                if reward_amount > 0:
-                    self.wallets.update_one(
-                        {"userId": user_id},
-                        {"$inc": {"balance": reward_amount}},
-                        upsert=True
-                    )
-                    reward_description = f"💰 Você ganhou uma recompensa de **R$ {reward_amount:,.2f}**!"
-            
-            elif reward_type == 'role':
-                role_id = new_level_data.get('rewardRoleId')
-                if role_id and isinstance(channel, discord.TextChannel) and channel.guild:
-                    role = channel.guild.get_role(int(role_id))
-                    if role:
-                        try:
-                            await user.add_roles(role)
-                            reward_description = f"✨ Você recebeu o cargo **{role.name}**!"
-                        except discord.Forbidden:
-                            reward_description = f"⚠️ Não foi possível adicionar o cargo '{role.name}'. Verifique as permissões do bot."
-                        except Exception as e:
-                            print(f"Error adding role {role_id} to user {user_id}: {e}")
-                            reward_description = f"⚠️ Ocorreu um erro ao tentar adicionar o cargo."
-                    else:
-                        reward_description = f"⚠️ O cargo com ID `{role_id}` não foi encontrado no servidor."
+            # Handle rewards of every level crossed
+            reward_descriptions = []
+            total_reward_amount = 0
+            for level_info in levels_crossed:
+                reward_type = level_info.get('rewardType')
+                if reward_type == 'money':
+                    reward_amount = level_info.get('rewardAmount', 0)
+                    if reward_amount > 0:
+                        total_reward_amount += reward_amount
+                        reward_descriptions.append(f"💰 Você ganhou uma recompensa de **R$ {reward_amount:,.2f}**!")
+                
+                elif reward_type == 'role':
+                    role_id = level_info.get('rewardRoleId')
+                    if role_id and isinstance(channel, discord.TextChannel) and channel.guild:
+                        role = channel.guild.get_role(int(role_id))
+                        if role:
+                            try:
+                                await user.add_roles(role)
+                                reward_descriptions.append(f"✨ Você recebeu o cargo **{role.name}**!")
+                            except discord.Forbidden:
+                                reward_descriptions.append(f"⚠️ Não foi possível adicionar o cargo '{role.name}'. Verifique as permissões do bot.")
+                            except Exception as e:
+                                print(f"Error adding role {role_id} to user {user_id}: {e}")
+                                reward_descriptions.append(f"⚠️ Ocorreu um erro ao tentar adicionar o cargo.")
+                        else:
+                            reward_descriptions.append(f"⚠️ O cargo com ID `{role_id}` não foi encontrado no servidor.")
 
-            if reward_description:
-                level_up_embed.add_field(name="Recompensa", value=reward_description, inline=False)
+            # Money rewards of all levels crossed are paid with a single write
+            if total_reward_amount > 0:
+                await self.wallets.update_one(
+                    {"userId": user_id},
+                    {"$inc": {"balance": total_reward_amount}},
+                    upsert=True
+                )
+                ranking_cog = self.bot.get_cog('Ranking')
+                if ranking_cog:
+                    ranking_cog.invalidate('ricos')
+
+            if reward_descriptions:
+                level_up_embed.add_field(name="Recompensa", value="\n".join(reward_descriptions), inline=False)
             
             # Determine target channel
             bot_config = await self.get_bot_config()
@@ -158,15 +258,9 @@ class Leveling(commands.Cog):
         if not message.guild or message.author.bot:
             return
 
-        user_id = str(message.author.id)
-        
-        # Check cooldown
-        now = time.time()
-        if user_id in self.message_cooldowns and (now - self.message_cooldowns[user_id]) < self.MESSAGE_COOLDOWN_SECONDS:
+        # Check cooldown, starting a new one if it has passed
+        if self.message_cooldowns.hit(message.author.id):
             return
-            
-        # Add to cooldown
-        self.message_cooldowns[user_id] = now
 
         xp_to_grant = random.randint(15, 25)
         await self.grant_xp(message.author, xp_to_grant, message.channel)
@@ -1,9 +1,8 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import os
-from pymongo import MongoClient
 from dotenv import load_dotenv
+from utils.database import get_client
 import datetime
 from bson.objectid import ObjectId
 
@@ -12,21 +11,18 @@ load_dotenv()
 class Loja(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.client = MongoClient(os.getenv('MONGODB_URI'))
+        self.client = get_client(bot)
         self.db = self.client.timaocord
         self.inventory = self.db.user_inventory
         self.store_items = self.db.store_items
 
-    def cog_unload(self):
-        self.client.close()
-
     @app_commands.command(name="resgatar", description="🎁 Resgate um código de item comprado na loja.")
     @app_commands.describe(codigo="O código que você recebeu ao comprar na loja.")
     async def resgatar(self, interaction: discord.Interaction, codigo: str):
         await interaction.response.defer(ephemeral=True)
         user_id = str(interaction.user.id)
         
-        inventory_item = self.inventory.find_one({"redemptionCode": codigo.upper()})
+        inventory_item = await self.inventory.find_one({"redemptionCode": codigo.upper()})
 
         if not inventory_item:
             await interaction.followup.send("❌ Código de resgate inválido ou não encontrado.", ephemeral=True)
@@ -40,7 +36,7 @@ class Loja(commands.Cog):
             await interaction.followup.send("❌ Este código de resgate já foi utilizado.", ephemeral=True)
             return
 
-        store_item = self.store_items.find_one({"_id": inventory_item['itemId']})
+        store_item = await self.store_items.find_one({"_id": inventory_item['itemId']})
         if not store_item:
             await interaction.followup.send("❌ Erro interno: Item da loja não encontrado. Contate um administrador.", ephemeral=True)
             return
@@ -67,7 +63,7 @@ class Loja(commands.Cog):
                 
                 await member.add_roles(role)
                 
-                self.inventory.update_one(
+                await self.inventory.update_one(
                     {"_id": inventory_item['_id']}, 
                     {"$set": {"isRedeemed": True, "redeemedAt": datetime.datetime.now(datetime.timezone.utc)}}
                 )
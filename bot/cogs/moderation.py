@@ -2,10 +2,9 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import os
-from pymongo import MongoClient
 from dotenv import load_dotenv
-from bson.objectid import ObjectId
+from utils.database import get_client
+from utils.bot_config import get_config_provider
 import datetime
 import re
 
@@ -16,8 +15,7 @@ load_dotenv()
 def is_admin():
     async def predicate(interaction: discord.Interaction) -> bool:
         bot = interaction.client
-        config_collection = bot.db.timaocord_bot.config
-        config_doc = config_collection.find_one({"_id": ObjectId('669fdb5a907548817b848c48')})
+        config_doc = await get_config_provider(bot).get()
         
         if not config_doc or not config_doc.get('adminRoleId'):
             await interaction.response.send_message("❌ O cargo de administrador não está configurado.", ephemeral=True)
@@ -56,16 +54,15 @@ def parse_duration(duration_str: str) -> datetime.timedelta | None:
 class Moderation(commands.Cog):
     def __init__(self, bot):
         self.bot: commands.Bot = bot
-        if not hasattr(bot, 'db'):
-            bot.db = MongoClient(os.getenv('MONGODB_URI'))
+        self.client = get_client(bot)
         
-        self.db_timaocord = bot.db.timaocord
+        self.db_timaocord = self.client.timaocord
         self.users_collection = self.db_timaocord.users
         self.mod_actions_collection = self.db_timaocord.moderation_actions
-        self.config_collection = bot.db.timaocord_bot.config
+        self.config_provider = get_config_provider(bot)
 
     async def get_mod_log_channel(self):
-        config_doc = self.config_collection.find_one({"_id": ObjectId('669fdb5a907548817b848c48')})
+        config_doc = await self.config_provider.get()
         if not config_doc or not config_doc.get('moderationLogChannelId'):
             return None
         return self.bot.get_channel(int(config_doc['moderationLogChannelId']))
@@ -93,7 +90,7 @@ class Moderation(commands.Cog):
             "reason": motivo,
             "createdAt": datetime.datetime.now(datetime.timezone.utc)
         }
-        result = self.mod_actions_collection.insert_one(action)
+        result = await self.mod_actions_collection.insert_one(action)
         
         # Log to mod channel
         log_embed = discord.Embed(
@@ -146,7 +143,7 @@ class Moderation(commands.Cog):
             "type": "MUTE", "reason": motivo, "duration": duracao, "expiresAt": expires_at,
             "createdAt": datetime.datetime.now(datetime.timezone.utc)
         }
-        result = self.mod_actions_collection.insert_one(action)
+        result = await self.mod_actions_collection.insert_one(action)
         
         log_embed = discord.Embed(title="⏳ Usuário de Castigo", color=discord.Color.blue(), timestamp=datetime.datetime.now(datetime.timezone.utc))
         log_embed.add_field(name="Usuário", value=f"{usuario.mention} (`{usuario.id}`)", inline=False)
@@ -171,7 +168,7 @@ class Moderation(commands.Cog):
             await interaction.followup.send("❌ Não tenho permissão para banir este usuário no Discord.", ephemeral=True)
             return
 
-        self.users_collection.update_one({"discordId": str(usuario.id)}, {"$set": {"status": "Banned"}})
+        await self.users_collection.update_one({"discordId": str(usuario.id)}, {"$set": {"status": "Banned"}})
 
         action = {
             "userId": str(usuario.id), "userName": usuario.display_name, "userAvatar": str(usuario.display_avatar.url),
@@ -179,7 +176,7 @@ class Moderation(commands.Cog):
             "type": "BAN", "reason": motivo,
             "createdAt": datetime.datetime.now(datetime.timezone.utc)
         }
-        result = self.mod_actions_collection.insert_one(action)
+        result = await self.mod_actions_collection.insert_one(action)
         
         log_embed = discord.Embed(title="🚫 Usuário Banido", color=discord.Color.red(), timestamp=datetime.datetime.now(datetime.timezone.utc))
         log_embed.add_field(name="Usuário", value=f"{usuario.mention} (`{usuario.id}`)", inline=False)
@@ -206,7 +203,7 @@ class Moderation(commands.Cog):
             await interaction.followup.send("❌ Não tenho permissão para desbanir usuários.", ephemeral=True)
             return
 
-        self.users_collection.update_one({"discordId": id_usuario}, {"$set": {"status": "Active"}})
+        await self.users_collection.update_one({"discordId": id_usuario}, {"$set": {"status": "Active"}})
 
         action = {
             "userId": id_usuario, "userName": user.name, "userAvatar": str(user.display_avatar.url),
@@ -214,7 +211,7 @@ class Moderation(commands.Cog):
             "type": "UNBAN", "reason": motivo,
             "createdAt": datetime.datetime.now(datetime.timezone.utc)
         }
-        result = self.mod_actions_collection.insert_one(action)
+        result = await self.mod_actions_collection.insert_one(action)
 
         log_embed = discord.Embed(title="🔓 Usuário Desbanido", color=discord.Color.green(), timestamp=datetime.datetime.now(datetime.timezone.utc))
         log_embed.add_field(name="Usuário", value=f"{user.mention} (`{user.id}`)", inline=False)
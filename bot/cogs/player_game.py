@@ -3,34 +3,105 @@
 import discord
 from discord.ext import commands, tasks
 from discord import app_commands
-import os
-from pymongo import MongoClient
 from dotenv import load_dotenv
+from utils.database import get_client
+from utils.user_cache import get_user_cache
+from utils import ledger
 from bson.objectid import ObjectId
+from pymongo.errors import OperationFailure
 import asyncio
 import unicodedata
 import re
-import datetime
 
 load_dotenv()
 
+# Changes that can start a game, or stop the running one from the admin panel
+GAME_CHANGES_PIPELINE = [
+    {"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}
+]
+# Server errors meaning change streams are not supported (standalone mongod)
+CHANGE_STREAM_UNSUPPORTED_CODES = {20, 40573}
+
+def within_edit_distance(a: str, b: str, max_distance: int) -> bool:
+    """Banded Levenshtein: only cells within `max_distance` of the diagonal are computed."""
+    if abs(len(a) - len(b)) > max_distance:
+        return False
+    too_far = max_distance + 1
+    previous = [j if j <= max_distance else too_far for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [too_far] * (len(b) + 1)
+        if i <= max_distance:
+            current[0] = i
+        for j in range(max(1, i - max_distance), min(len(b), i + max_distance) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost, too_far)
+        if min(current) > max_distance:
+            return False
+        previous = current
+    return previous[len(b)] <= max_distance
+
+
+class AnswerMatcher:
+    """Compiled once per game from the normalized player name and aliases.
+
+    Accepts an exact answer, a single distinctive name token (a surname or
+    first name) or either of those with a small typo.
+    """
+
+    MIN_TOKEN_LENGTH = 4
+    # Name parts too common to identify a player on their own
+    IGNORED_TOKENS = frozenset({"junior", "filho", "neto", "sobrinho"})
+
+    def __init__(self, answers: list):
+        self.exact = frozenset(answers)
+        self.tokens = frozenset(
+            token for answer in answers for token in answer.split()
+            if len(token) >= self.MIN_TOKEN_LENGTH and token not in self.IGNORED_TOKENS
+        )
+        self.candidates = tuple(self.exact | self.tokens)
+
+    @staticmethod
+    def max_distance(length: int) -> int:
+        # Short names must be typed exactly; longer ones tolerate one or two typos
+        if length < 5:
+            return 0
+        return 1 if length < 9 else 2
+
+    def matches(self, guess: str) -> bool:
+        if not guess:
+            return False
+        if guess in self.exact or guess in self.tokens:
+            return True
+        for candidate in self.candidates:
+            distance = self.max_distance(len(candidate))
+            if distance and within_edit_distance(guess, candidate, distance):
+                return True
+        return False
+
+
 class PlayerGame(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.client = MongoClient(os.getenv('MONGODB_URI'))
+        self.client = get_client(bot)
         self.db = self.client.timaocord
         self.games_collection = self.db.player_guessing_games
         self.wallets_collection = self.db.wallets
         self.users_collection = self.db.users
+        self.user_cache = get_user_cache(bot)
         self.active_game_id = None
         self.game_task = None
-        self.player_game_loop.start()
+        # In-memory copy of the running game so on_message never reads the DB
+        self.active_game = None
+        self.active_channel_id = None
+        self.answer_matcher = None
+        # Games are started from a change stream; player_game_loop is only the fallback
+        self.watch_task = self.bot.loop.create_task(self.watch_for_activations())
 
     def cog_unload(self):
+        self.watch_task.cancel()
         self.player_game_loop.cancel()
         if self.game_task:
             self.game_task.cancel()
-        self.client.close()
         
     def normalize_str(self, s: str) -> str:
         # Decompose characters into base + combining characters (e.g., 'á' -> 'a' + '´')
@@ -41,6 +112,25 @@ class PlayerGame(commands.Cog):
         s = re.sub(r'\s+', ' ', s).strip()
         return s
 
+    def build_answer_matcher(self, game: dict) -> AnswerMatcher:
+        # Normalized once per game instead of once per message
+        answers = [game['playerName'], *game.get('aliases', [])]
+        return AnswerMatcher([a for a in (self.normalize_str(answer) for answer in answers) if a])
+
+    def clear_active_game(self):
+        self.active_game = None
+        self.active_channel_id = None
+        self.answer_matcher = None
+
+    async def stop_active_game(self):
+        """Stops the running game after it was deactivated outside the bot (e.g. in the admin panel)."""
+        print(f"Player game {self.active_game_id} was deactivated externally. Stopping it.")
+        self.clear_active_game()
+        self.active_game_id = None
+        if self.game_task:
+            self.game_task.cancel()
+            self.game_task = None
+
     async def start_game_if_active(self, active_game):
         self.active_game_id = active_game['_id']
         
@@ -58,6 +148,10 @@ class PlayerGame(commands.Cog):
             print(f"Player game channel with ID {channel_id_str} not found.")
             return
             
+        self.active_game = active_game
+        self.active_channel_id = channel.id
+        self.answer_matcher = self.build_answer_matcher(active_game)
+
         embed = discord.Embed(
             title="🤔 Quem é o Jogador?",
             description="Um novo jogo de adivinhação começou! Use as dicas para descobrir o jogador misterioso. O primeiro a acertar leva o prêmio!",
@@ -108,6 +202,7 @@ class PlayerGame(commands.Cog):
             pass # Game was won and task was cancelled
 
     async def end_game(self, channel: discord.TextChannel, winner: discord.User | None, game_data: dict, reason: str):
+        self.clear_active_game()
         player_name = game_data['playerName']
         prize = game_data['prizeAmount']
         
@@ -121,25 +216,18 @@ class PlayerGame(commands.Cog):
             
             # Award prize
             user_id = str(winner.id)
-            user_doc = self.users_collection.find_one({"discordId": user_id})
-            if user_doc:
-                new_transaction = {
-                    "id": str(ObjectId()), "type": "Prêmio",
-                    "description": f"Prêmio do jogo 'Quem é o Jogador?'",
-                    "amount": prize,
-                    "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
-                    "status": "Concluído"
-                }
-                self.wallets_collection.update_one(
-                    {"userId": user_id},
-                    {"$inc": {"balance": prize}, "$push": {"transactions": {"$each": [new_transaction], "$sort": {"date": -1}}}},
-                    upsert=True
-                )
-                self.users_collection.update_one(
+            if await self.user_cache.is_registered(user_id):
+                new_transaction = ledger.new_transaction("Prêmio", "Prêmio do jogo 'Quem é o Jogador?'", prize)
+                await ledger.record_transaction(self.db, user_id, prize, new_transaction)
+                await self.users_collection.update_one(
                     {"discordId": user_id},
                     {"$addToSet": {"unlockedAchievements": "win_player_game"}}
                 )
 
+                ranking_cog = self.bot.get_cog('Ranking')
+                if ranking_cog:
+                    ranking_cog.invalidate('ricos')
+
         else: # No winner
             embed = discord.Embed(
                 title="🏁 Jogo Finalizado!",
@@ -158,7 +246,7 @@ class PlayerGame(commands.Cog):
                 "winnerAvatar": str(winner.display_avatar.url) if winner else None,
             }
         }
-        self.games_collection.update_one({"_id": self.active_game_id}, update_doc)
+        await self.games_collection.update_one({"_id": self.active_game_id}, update_doc)
 
         self.active_game_id = None
         if self.game_task:
@@ -167,33 +255,70 @@ class PlayerGame(commands.Cog):
     
     @tasks.loop(seconds=10.0)
     async def player_game_loop(self):
-        # This loop only checks if a game should START. The active game logic is in reveal_loop.
+        # Fallback for deployments without change streams (e.g. a standalone local mongod)
+        if self.active_channel_id is not None:
+            await self.check_active_game_status()
+        await self.check_for_active_game()
+
+    async def check_active_game_status(self):
+        """Stops the running game if it was deactivated or deleted, as the change stream would."""
+        game_id = self.active_game_id
+        game = await self.games_collection.find_one({"_id": game_id}, {"status": 1})
+        # The game may have ended in the bot while we were waiting on the read
+        if self.active_game_id != game_id or self.active_channel_id is None:
+            return
+        if not game or game.get('status') != 'active':
+            await self.stop_active_game()
+
+    async def check_for_active_game(self):
+        # This only checks if a game should START. The active game logic is in reveal_loop.
         if self.active_game_id is None:
-            active_game = self.games_collection.find_one({"status": "active"})
+            active_game = await self.games_collection.find_one({"status": "active"})
             if active_game:
                 await self.start_game_if_active(active_game)
 
+    async def watch_for_activations(self):
+        """Starts a game as soon as its status is flipped to active, without polling."""
+        await self.bot.wait_until_ready()
+        while True:
+            try:
+                async with self.games_collection.watch(GAME_CHANGES_PIPELINE, full_document='updateLookup') as stream:
+                    # A game activated before the stream was opened would otherwise be missed
+                    await self.check_for_active_game()
+                    async for change in stream:
+                        game = change.get('fullDocument')
+                        game_id = change['documentKey']['_id']
+                        if self.active_channel_id is not None and game_id == self.active_game_id:
+                            if not game or game.get('status') != 'active':
+                                await self.stop_active_game()
+                        elif game and game.get('status') == 'active' and self.active_game_id is None:
+                            await self.start_game_if_active(game)
+            except OperationFailure as e:
+                if e.code in CHANGE_STREAM_UNSUPPORTED_CODES:
+                    print(f"Change streams unavailable for player games ({e}). Falling back to polling.")
+                    self.player_game_loop.start()
+                    return
+                print(f"Player game change stream failed: {e}. Reconnecting in 5 seconds.")
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Player game change stream interrupted: {e}. Reconnecting in 5 seconds.")
+                await asyncio.sleep(5)
+
     @player_game_loop.before_loop
     async def before_player_game_loop(self):
         await self.bot.wait_until_ready()
     
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
-        if not self.active_game_id or message.author.bot:
-            return
-
-        active_game = self.games_collection.find_one({"_id": self.active_game_id})
-        if not active_game or active_game['status'] != 'active':
+        # Cheap channel filter first, so chatter outside the game channel costs nothing
+        if message.channel.id != self.active_channel_id or message.author.bot:
             return
-        
-        # Check if the message is in the correct channel
-        if str(message.channel.id) != active_game.get('channelId'):
-            return
-
-        normalized_guess = self.normalize_str(message.content)
-        normalized_answer = self.normalize_str(active_game['playerName'])
 
-        if normalized_guess == normalized_answer:
+        if self.answer_matcher and self.answer_matcher.matches(self.normalize_str(message.content)):
+            active_game = self.active_game
+            self.clear_active_game() # Only the first correct guess wins
             await self.end_game(message.channel, message.author, active_game, "Um vencedor foi encontrado!")
 
     @app_commands.command(name="iniciar_jogador", description="[Admin] Inicia o jogo 'Quem é o Jogador?'.")
@@ -210,7 +335,7 @@ class PlayerGame(commands.Cog):
             await interaction.response.send_message("❌ ID do jogo inválido.", ephemeral=True)
             return
 
-        game = self.games_collection.find_one({"_id": game_id})
+        game = await self.games_collection.find_one({"_id": game_id})
         if not game:
             await interaction.response.send_message("❌ Jogo não encontrado com este ID.", ephemeral=True)
             return
@@ -219,7 +344,7 @@ class PlayerGame(commands.Cog):
             await interaction.response.send_message("❌ Este jogo não tem um canal configurado. Edite-o no painel admin.", ephemeral=True)
             return
 
-        self.games_collection.update_one({"_id": game_id}, {"$set": {"status": "active"}})
+        await self.games_collection.update_one({"_id": game_id}, {"$set": {"status": "active"}})
         await interaction.response.send_message(f"✅ Jogo '{game['playerName']}' iniciado! O bot assumirá a partir daqui.", ephemeral=True)
 
 
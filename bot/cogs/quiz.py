@@ -3,10 +3,12 @@ import discord
 from discord.ext import commands
 from discord import app_commands, ui
 import os
-from pymongo import MongoClient
 from dotenv import load_dotenv
+from utils.database import get_client
+from utils.user_cache import get_user_cache
+from utils import ledger
 from bson.objectid import ObjectId
-import datetime
+from pymongo import UpdateOne, InsertOne
 import asyncio
 from collections import defaultdict
 import random
@@ -57,59 +59,61 @@ class QuizQuestionView(ui.View):
 class Quiz(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.client = MongoClient(os.getenv('MONGODB_URI'))
+        self.client = get_client(bot)
         self.db = self.client.timaocord
         self.quizzes_collection = self.db.quizzes
         self.wallets_collection = self.db.wallets
         self.users_collection = self.db.users
+        self.user_cache = get_user_cache(bot)
         # Track active quizzes to prevent multiple instances
         self.active_quizzes = set()
 
-    def cog_unload(self):
-        self.client.close()
-    
     async def quiz_autocomplete(self, interaction: discord.Interaction, current: str):
-        quizzes = self.quizzes_collection.find(
+        quizzes = await self.quizzes_collection.find(
             {"name": {"$regex": current, "$options": "i"}}
-        ).limit(25)
+        ).limit(25).to_list(length=25)
         return [
             app_commands.Choice(name=quiz['name'], value=str(quiz['_id']))
             for quiz in quizzes
         ]
 
-    async def award_prize(self, user: discord.User, prize_amount: float, quiz_name: str):
-        user_id = str(user.id)
-        user_account = self.users_collection.find_one({"discordId": user_id})
-        
-        if not user_account:
-            try:
-                site_url = os.getenv('SITE_URL', 'http://localhost:9003')
-                await user.send(f"Parabéns por ganhar no quiz! Para receber seu prêmio, você precisa fazer login no nosso site pelo menos uma vez: {site_url}")
-            except discord.Forbidden:
-                pass # Can't send DMs
-            return
+    async def notify_unregistered_winner(self, user: discord.User):
+        try:
+            site_url = os.getenv('SITE_URL', 'http://localhost:9003')
+            await user.send(f"Parabéns por ganhar no quiz! Para receber seu prêmio, você precisa fazer login no nosso site pelo menos uma vez: {site_url}")
+        except discord.Forbidden:
+            pass # Can't send DMs
+
+    async def award_prizes(self, winners: list, prize_amount: float, quiz_name: str):
+        """Pays every winner of a question with one bulk write per collection."""
+        registered = await self.user_cache.registered_among([str(winner.id) for winner in winners])
+        # Each user answers a question at most once, so winners has no duplicates
+        paid_ids = [str(winner.id) for winner in winners if str(winner.id) in registered]
+        unregistered = [winner for winner in winners if str(winner.id) not in registered]
+
+        if paid_ids:
+            wallet_updates = []
+            ledger_entries = []
+            for user_id in paid_ids:
+                new_transaction = ledger.new_transaction("Prêmio", f"Prêmio do Quiz: {quiz_name}", prize_amount)
+                wallet_updates.append(UpdateOne({"userId": user_id}, ledger.wallet_update(prize_amount, new_transaction), upsert=True))
+                ledger_entries.append(InsertOne(ledger.ledger_entry(user_id, new_transaction)))
+
+            await asyncio.gather(
+                self.wallets_collection.bulk_write(wallet_updates, ordered=False),
+                self.db.wallet_transactions.bulk_write(ledger_entries, ordered=False),
+                self.users_collection.bulk_write([
+                    UpdateOne({"discordId": user_id}, {"$addToSet": {"unlockedAchievements": "win_quiz"}})
+                    for user_id in paid_ids
+                ], ordered=False)
+            )
 
-        new_transaction = {
-            "id": str(ObjectId()), "type": "Prêmio",
-            "description": f"Prêmio do Quiz: {quiz_name}",
-            "amount": prize_amount,
-            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
-            "status": "Concluído"
-        }
-
-        self.wallets_collection.update_one(
-            {"userId": user_id},
-            {
-                "$inc": {"balance": prize_amount},
-                "$push": {"transactions": {"$each": [new_transaction], "$sort": {"date": -1}}}
-            },
-            upsert=True
-        )
+            ranking_cog = self.bot.get_cog('Ranking')
+            if ranking_cog:
+                ranking_cog.invalidate('ricos')
 
-        self.users_collection.update_one(
-            {"discordId": user_id},
-            {"$addToSet": {"unlockedAchievements": "win_quiz"}}
-        )
+        if unregistered:
+            await asyncio.gather(*(self.notify_unregistered_winner(user) for user in unregistered))
     
     async def start_quiz_flow(self, quiz_id: str, interaction: discord.Interaction = None):
         """ The main logic for running a quiz. Can be called by a command or a task. """
@@ -128,7 +132,7 @@ class Quiz(commands.Cog):
                 await interaction.followup.send("❌ ID do quiz inválido.", ephemeral=True)
             return
 
-        quiz_doc = self.quizzes_collection.find_one({"_id": quiz_obj_id})
+        quiz_doc = await self.quizzes_collection.find_one({"_id": quiz_obj_id})
         
         if not quiz_doc:
             if interaction:
@@ -220,8 +224,7 @@ class Quiz(commands.Cog):
             if view.winners:
                 prize = quiz_doc.get('rewardPerQuestion', 0)
                 if prize > 0:
-                    for winner in view.winners:
-                        await self.award_prize(winner, prize, quiz_doc.get('name', 'Quiz'))
+                    await self.award_prizes(view.winners, prize, quiz_doc.get('name', 'Quiz'))
                 
                 for winner in view.winners:
                     scores[winner.id] += 1
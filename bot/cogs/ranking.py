@@ -1,28 +1,100 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
 import datetime
-import os
-from pymongo import MongoClient
+import asyncio
+import time
 from dotenv import load_dotenv
+from utils.database import get_client
 
 load_dotenv()
 
+LEADERBOARD_CATEGORIES = ("ganhadores", "ricos", "ativos", "niveis")
+LEADERBOARD_REFRESH_SECONDS = 600 # Full refresh for changes made outside the bot (bets settled on the site)
+
+def leaderboard_pipeline(match: dict, sort_field: str, limit: int = 10) -> list:
+    """Top-N pipeline that joins each row with its user's name in the same round trip."""
+    return [
+        {"$match": match},
+        {"$sort": {sort_field: -1}},
+        {"$limit": limit},
+        {"$lookup": {"from": "users", "localField": "userId", "foreignField": "discordId", "as": "user"}},
+        {"$project": {
+            "_id": 0,
+            "userId": 1,
+            sort_field: 1,
+            "name": {"$arrayElemAt": ["$user.name", 0]},
+            "hasUser": {"$gt": [{"$size": "$user"}, 0]},
+        }},
+    ]
+
+def format_user_name(entry: dict) -> str:
+    if not entry.get("hasUser"):
+        return "Usuário Desconhecido"
+    return entry.get("name") or f"Usuário {entry['userId'][-4:]}"
+
 class Ranking(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.client = MongoClient(os.getenv('MONGODB_URI'))
+        self.client = get_client(bot)
         self.db = self.client.timaocord
         self.user_stats = self.db.user_stats
         self.wallets = self.db.wallets
         self.users = self.db.users
 
+        # Materialized top 10 of each category: {categoria: (timestamp, rows)}
+        self.leaderboards = {}
+        self.dirty_categories = set()
+        self.refresh_lock = asyncio.Lock()
+        self.refresh_leaderboards.start()
+
     def cog_unload(self):
-        self.client.close()
+        self.refresh_leaderboards.cancel()
+
+    def invalidate(self, *categories: str):
+        """Marks leaderboards as stale. Called by the cogs that change balances or XP."""
+        self.dirty_categories.update(categories)
+
+    async def fetch_leaderboard(self, categoria: str) -> list:
+        if categoria == "ganhadores":
+            pipeline = leaderboard_pipeline({"totalWinnings": {"$gt": 0}}, "totalWinnings")
+            return await self.user_stats.aggregate(pipeline).to_list(length=10)
+        if categoria == "ricos":
+            return await self.wallets.aggregate(leaderboard_pipeline({}, "balance")).to_list(length=10)
+        if categoria == "ativos":
+            return await self.user_stats.aggregate(leaderboard_pipeline({}, "totalBets")).to_list(length=10)
+        if categoria == "niveis":
+            cursor = self.users.find({}, {"_id": 0, "name": 1, "level": 1, "xp": 1})
+            return await cursor.sort([("level", -1), ("xp", -1)]).limit(10).to_list(length=10)
+        return []
+
+    async def refresh_category(self, categoria: str):
+        # Cleared before fetching so an invalidation that arrives mid-fetch is kept
+        self.dirty_categories.discard(categoria)
+        rows = await self.fetch_leaderboard(categoria)
+        self.leaderboards[categoria] = (time.time(), rows)
+
+    async def get_leaderboard(self, categoria: str) -> list:
+        """Returns the materialized leaderboard, loading it only if it was never built."""
+        cached = self.leaderboards.get(categoria)
+        if cached:
+            return cached[1]
+        async with self.refresh_lock:
+            if categoria not in self.leaderboards:
+                await self.refresh_category(categoria)
+            return self.leaderboards[categoria][1]
 
-    async def get_user_name(self, user_id):
-        user_doc = self.users.find_one({"discordId": user_id})
-        return user_doc.get("name", f"Usuário {user_id[-4:]}") if user_doc else f"Usuário Desconhecido"
+    @tasks.loop(seconds=30.0)
+    async def refresh_leaderboards(self):
+        now = time.time()
+        async with self.refresh_lock:
+            for categoria in LEADERBOARD_CATEGORIES:
+                cached = self.leaderboards.get(categoria)
+                if categoria in self.dirty_categories or not cached or (now - cached[0]) >= LEADERBOARD_REFRESH_SECONDS:
+                    try:
+                        await self.refresh_category(categoria)
+                    except Exception as e:
+                        print(f"Error refreshing the '{categoria}' leaderboard: {e}")
 
     @app_commands.command(name="ranking", description="🏆 Exibe os rankings da FielBet.")
     @app_commands.describe(categoria="A categoria do ranking que você quer ver.")
@@ -41,32 +113,29 @@ class Ranking(commands.Cog):
         )
         
         description = ""
+        rank_data = await self.get_leaderboard(categoria.value)
         
         if categoria.value == "ganhadores":
             embed.title = "🏆 Ranking - Maiores Ganhadores"
-            rank_data = self.user_stats.find({"totalWinnings": {"$gt": 0}}).sort("totalWinnings", -1).limit(10)
-            for i, user in enumerate(list(rank_data)):
-                user_name = await self.get_user_name(user['userId'])
+            for i, user in enumerate(rank_data):
+                user_name = format_user_name(user)
                 description += f"**{i+1}.** {user_name} - **R$ {user['totalWinnings']:,.2f}**\n"
         
         elif categoria.value == "ricos":
             embed.title = "💰 Ranking - Mais Ricos"
-            rank_data = self.wallets.find().sort("balance", -1).limit(10)
-            for i, user in enumerate(list(rank_data)):
-                user_name = await self.get_user_name(user['userId'])
+            for i, user in enumerate(rank_data):
+                user_name = format_user_name(user)
                 description += f"**{i+1}.** {user_name} - **R$ {user['balance']:,.2f}**\n"
 
         elif categoria.value == "ativos":
             embed.title = "🏅 Ranking - Mais Ativos (por nº de apostas)"
-            rank_data = self.user_stats.find().sort("totalBets", -1).limit(10)
-            for i, user in enumerate(list(rank_data)):
-                user_name = await self.get_user_name(user['userId'])
+            for i, user in enumerate(rank_data):
+                user_name = format_user_name(user)
                 description += f"**{i+1}.** {user_name} - **{user['totalBets']} apostas**\n"
         
         elif categoria.value == "niveis":
             embed.title = "🌟 Ranking - Top Níveis"
-            rank_data = self.users.find().sort([("level", -1), ("xp", -1)]).limit(10)
-            for i, user in enumerate(list(rank_data)):
+            for i, user in enumerate(rank_data):
                 level = user.get('level', 1)
                 xp = user.get('xp', 0)
                 name = user.get('name', 'Usuário Desconhecido')
@@ -2,14 +2,24 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 import os
-from pymongo import MongoClient
 from dotenv import load_dotenv
+from utils.database import get_client
+from utils.user_cache import get_user_cache
+from utils.indexes import ensure_collection_indexes, has_planned_index
+from pymongo.errors import BulkWriteError
 import datetime
 import secrets
 import string
+import io
 
 load_dotenv()
 
+DUPLICATE_KEY_ERROR = 11000
+# Rounds of fresh codes tried for the slots that collided with existing ones
+MAX_CODE_ALLOCATION_ATTEMPTS = 5
+# Above this many codes /gerar_codigo sends them as a file instead of in the embed
+EMBED_CODES_LIMIT = 20
+
 # Helper to generate a unique code
 def generate_code(length=8):
     alphabet = string.ascii_uppercase + string.digits
@@ -18,20 +28,76 @@ def generate_code(length=8):
 class Rewards(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.client = MongoClient(os.getenv('MONGODB_URI'))
+        self.client = get_client(bot)
         self.db = self.client.timaocord
         self.users_collection = self.db.users
         self.promo_codes_collection = self.db.promo_codes
+        self.user_cache = get_user_cache(bot)
+        # Whether the unique code index exists; without it the allocator checks for collisions itself
+        self.code_index_ready = False
+
+    async def cog_load(self):
+        # Codes must not be issued before the unique index exists, so don't wait for the bootstrap
+        try:
+            await ensure_collection_indexes(self.db, "promo_codes")
+            self.code_index_ready = await has_planned_index(self.db, "promo_codes", "code_unique")
+        except Exception as e:
+            print(f"Error creating promo code indexes: {e}")
+        if not self.code_index_ready:
+            print("Unique promo code index is missing. Checking new codes for collisions before inserting them.")
+
+    async def unused_codes(self, codes: list) -> list:
+        """Drops codes repeated in `codes` or already in the collection, with one query."""
+        codes = list(dict.fromkeys(codes))
+        taken = {
+            code_doc["code"]
+            async for code_doc in self.promo_codes_collection.find({"code": {"$in": codes}}, {"_id": 0, "code": 1})
+        }
+        return [code for code in codes if code not in taken]
+
+    async def allocate_codes(self, build_doc, quantity: int) -> list:
+        """Inserts `quantity` promo codes built by `build_doc(code)` and returns the codes.
+
+        Codes are inserted unordered in bulk; only the ones rejected by the unique
+        index are regenerated, so there is no lookup before each insert. If the
+        index couldn't be created, each batch is checked with one $in query instead.
+        """
+        allocated = []
+        for _ in range(MAX_CODE_ALLOCATION_ATTEMPTS):
+            missing = quantity - len(allocated)
+            if missing <= 0:
+                break
 
-    def cog_unload(self):
-        self.client.close()
+            codes = [generate_code() for _ in range(missing)]
+            if not self.code_index_ready:
+                codes = await self.unused_codes(codes)
+            code_docs = [build_doc(code) for code in codes]
+            if not code_docs:
+                continue
+            try:
+                await self.promo_codes_collection.insert_many(code_docs, ordered=False)
+                rejected = set()
+            except BulkWriteError as e:
+                write_errors = e.details.get("writeErrors", [])
+                if any(error.get("code") != DUPLICATE_KEY_ERROR for error in write_errors):
+                    raise
+                rejected = {error["index"] for error in write_errors}
+            allocated.extend(doc["code"] for i, doc in enumerate(code_docs) if i not in rejected)
+
+        if len(allocated) < quantity:
+            print(f"Promo code allocator gave up with {len(allocated)} of {quantity} codes after repeated collisions.")
+        return allocated
 
     @app_commands.command(name="diaria", description="💰 Resgate seu código de recompensa diária.")
     async def diaria(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
         user_id = str(interaction.user.id)
         
-        user_doc = self.users_collection.find_one({"discordId": user_id})
+        # Known unregistered users are answered without touching the database
+        user_doc = None
+        if self.user_cache.cached(user_id) is not False:
+            user_doc = await self.users_collection.find_one({"discordId": user_id}, {"lastDailyCodeClaim": 1})
+            self.user_cache.remember(user_id, user_doc is not None)
         
         if not user_doc:
             site_url = os.getenv('SITE_URL', 'http://localhost:9003')
@@ -51,15 +117,8 @@ class Rewards(commands.Cog):
              await interaction.followup.send(f"Você já resgatou seu código diário. Tente novamente <t:{int(cooldown_ends.timestamp())}:R>.", ephemeral=True)
              return
 
-        # Generate a new code
-        new_code = generate_code()
-        
-        # Ensure code is unique (highly unlikely to collide, but good practice)
-        while self.promo_codes_collection.find_one({"code": new_code}):
-            new_code = generate_code()
-
-        code_doc = {
-            "code": new_code,
+        allocated = await self.allocate_codes(lambda code: {
+            "code": code,
             "type": "DAILY",
             "description": "Recompensa Diária do Discord",
             "value": 250,
@@ -69,10 +128,13 @@ class Rewards(commands.Cog):
             "createdAt": now,
             "expiresAt": now + datetime.timedelta(minutes=30),
             "createdBy": "SYSTEM_DISCORD",
-        }
-        
-        self.promo_codes_collection.insert_one(code_doc)
-        self.users_collection.update_one({"discordId": user_id}, {"$set": {"lastDailyCodeClaim": now}}, upsert=True)
+        }, 1)
+        if not allocated:
+            await interaction.followup.send("Ocorreu um erro ao gerar seu código. Tente novamente.", ephemeral=True)
+            return
+        new_code = allocated[0]
+
+        await self.users_collection.update_one({"discordId": user_id}, {"$set": {"lastDailyCodeClaim": now}}, upsert=True)
         
         embed = discord.Embed(
             title="✅ Seu Código Diário!",
@@ -91,42 +153,43 @@ class Rewards(commands.Cog):
         app_commands.Choice(name="XP", value="xp")
     ])
     @app_commands.describe(limite="O número máximo de vezes que cada código pode ser usado. Deixe em branco para ilimitado.")
-    async def gerar_codigo(self, interaction: discord.Interaction, tipo: app_commands.Choice[str], valor: float, quantidade: app_commands.Range[int, 1, 20], descricao: str, limite: app_commands.Range[int, 1, 1000] = None):
+    async def gerar_codigo(self, interaction: discord.Interaction, tipo: app_commands.Choice[str], valor: float, quantidade: app_commands.Range[int, 1, 10000], descricao: str, limite: app_commands.Range[int, 1, 1000] = None):
             
         await interaction.response.defer(ephemeral=True)
         
-        generated_codes = []
-        for _ in range(quantidade):
-            new_code = generate_code()
-            while self.promo_codes_collection.find_one({"code": new_code}):
-                new_code = generate_code()
-                
-            code_doc = {
-                "code": new_code,
-                "type": tipo.value.upper(),
-                "description": descricao,
-                "value": valor,
-                "status": "ACTIVE",
-                "maxUses": limite,
-                "redeemedBy": [],
-                "createdAt": datetime.datetime.now(datetime.timezone.utc),
-                "expiresAt": None,
-                "createdBy": str(interaction.user.id),
-            }
-            self.promo_codes_collection.insert_one(code_doc)
-            generated_codes.append(new_code)
-            
+        created_at = datetime.datetime.now(datetime.timezone.utc)
+        generated_codes = await self.allocate_codes(lambda code: {
+            "code": code,
+            "type": tipo.value.upper(),
+            "description": descricao,
+            "value": valor,
+            "status": "ACTIVE",
+            "maxUses": limite,
+            "redeemedBy": [],
+            "createdAt": created_at,
+            "expiresAt": None,
+            "createdBy": str(interaction.user.id),
+        }, quantidade)
+
         codes_str = "\n".join(generated_codes)
         limite_str = str(limite) if limite is not None else "Ilimitado"
 
         embed = discord.Embed(
-            title=f"✅ {quantidade} Código(s) Gerado(s)!",
+            title=f"✅ {len(generated_codes)} Código(s) Gerado(s)!",
             description=f"**Tipo:** {tipo.name}\n**Valor:** {valor}\n**Limite de Uso:** {limite_str}\n**Descrição:** {descricao}",
             color=0x1E90FF
         )
-        embed.add_field(name="Códigos", value=f"```\n{codes_str}\n```")
-        
-        await interaction.followup.send(embed=embed, ephemeral=True)
+        if len(generated_codes) < quantidade:
+            embed.set_footer(text=f"Apenas {len(generated_codes)} de {quantidade} códigos puderam ser gerados.")
+
+        if len(generated_codes) <= EMBED_CODES_LIMIT:
+            embed.add_field(name="Códigos", value=f"```\n{codes_str}\n```")
+            await interaction.followup.send(embed=embed, ephemeral=True)
+        else:
+            # Large campaigns don't fit in an embed, so the codes go out as a text file
+            codes_file = discord.File(io.BytesIO(codes_str.encode()), filename="codigos.txt")
+            embed.add_field(name="Códigos", value="Enviados no arquivo `codigos.txt`.")
+            await interaction.followup.send(embed=embed, file=codes_file, ephemeral=True)
         
     @gerar_codigo.error
     async def on_gerar_codigo_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
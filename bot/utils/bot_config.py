@@ -0,0 +1,47 @@
+import asyncio
+import time
+from bson.objectid import ObjectId
+from utils.database import get_client
+
+# Fixed ID for the single bot config document
+BOT_CONFIG_ID = ObjectId('669fdb5a907548817b848c48')
+
+
+class BotConfigProvider:
+    """In-memory copy of the bot config document shared by every cog and check.
+
+    The copy is refreshed after CACHE_SECONDS at the latest; call
+    `invalidate()` (e.g. via `/admin recarregar_config`) to pick up changes
+    made in the admin panel immediately.
+    """
+
+    CACHE_SECONDS = 300
+
+    def __init__(self, config_collection):
+        self.collection = config_collection
+        self._cached = None  # Stores (timestamp, config_doc)
+        self._lock = asyncio.Lock()
+
+    async def get(self) -> dict:
+        cached = self._cached
+        if cached and (time.time() - cached[0]) < self.CACHE_SECONDS:
+            return cached[1]
+
+        # Concurrent callers wait for a single read instead of each querying
+        async with self._lock:
+            cached = self._cached
+            if cached and (time.time() - cached[0]) < self.CACHE_SECONDS:
+                return cached[1]
+            config_doc = await self.collection.find_one({"_id": BOT_CONFIG_ID}) or {}
+            self._cached = (time.time(), config_doc)
+            return config_doc
+
+    def invalidate(self):
+        self._cached = None
+
+
+def get_config_provider(bot) -> BotConfigProvider:
+    """Returns the bot-wide config provider, creating it on first use."""
+    if getattr(bot, 'config_provider', None) is None:
+        bot.config_provider = BotConfigProvider(get_client(bot).timaocord_bot.config)
+    return bot.config_provider
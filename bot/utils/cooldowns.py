@@ -0,0 +1,45 @@
+import time
+from collections import OrderedDict
+
+
+class CooldownStore:
+    """Fixed-length cooldowns keyed by integer IDs.
+
+    Entries are kept in expiry order, so expired ones are dropped from the
+    front on every access and memory stays proportional to the IDs that were
+    seen during the last `seconds`.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self._expires = OrderedDict()  # Stores id: expires_at (monotonic), oldest first
+
+    def _prune(self, now: float):
+        while self._expires:
+            expires_at = next(iter(self._expires.values()))
+            if expires_at > now:
+                break
+            self._expires.popitem(last=False)
+
+    def hit(self, key: int, now: float | None = None) -> bool:
+        """Returns True if `key` is on cooldown, otherwise starts its cooldown and returns False."""
+        now = time.monotonic() if now is None else now
+        self._prune(now)
+        if key in self._expires:
+            return True
+        self._expires[key] = now + self.seconds
+        return False
+
+    def remaining(self, key: int, now: float | None = None) -> float:
+        """Seconds left on the cooldown of `key`, 0 if it is not on cooldown."""
+        now = time.monotonic() if now is None else now
+        expires_at = self._expires.get(key)
+        return max(0.0, expires_at - now) if expires_at else 0.0
+
+    def stats(self) -> dict:
+        """Size information for monitoring."""
+        self._prune(time.monotonic())
+        return {"size": len(self._expires), "seconds": self.seconds}
+
+    def __len__(self):
+        return len(self._expires)
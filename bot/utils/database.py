@@ -0,0 +1,40 @@
+import os
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+from utils.indexes import start_index_bootstrap
+
+load_dotenv()
+
+# Pool settings for the single client shared by every cog.
+MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', 50))
+MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', 5))
+MAX_IDLE_TIME_MS = 60_000
+SERVER_SELECTION_TIMEOUT_MS = 5_000
+
+
+def get_client(bot) -> AsyncIOMotorClient:
+    """Returns the bot-wide Motor client, creating it on first use.
+
+    The client lives on `bot.db` so checks that only receive an interaction
+    (via `interaction.client`) can reach it too. Cogs must not close it.
+    Creating it also starts building any missing indexes in the background.
+    """
+    if getattr(bot, 'db', None) is None:
+        bot.db = AsyncIOMotorClient(
+            os.getenv('MONGODB_URI'),
+            maxPoolSize=MAX_POOL_SIZE,
+            minPoolSize=MIN_POOL_SIZE,
+            maxIdleTimeMS=MAX_IDLE_TIME_MS,
+            serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS,
+            retryWrites=True,
+        )
+        start_index_bootstrap(bot, bot.db.timaocord)
+    return bot.db
+
+
+def close_client(bot):
+    """Closes the shared client. Call once when the bot shuts down."""
+    client = getattr(bot, 'db', None)
+    if client is not None:
+        client.close()
+        bot.db = None
@@ -0,0 +1,197 @@
+import asyncio
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+
+# Expired daily codes are kept this long so the site can still report them as expired
+DAILY_CODE_RETENTION_SECONDS = 24 * 60 * 60
+
+# Every index the bot's queries rely on, per collection of the timaocord database.
+INDEX_PLAN = {
+    "users": [
+        IndexModel([("discordId", 1)]),
+        # /ranking niveis
+        IndexModel([("level", -1), ("xp", -1)]),
+    ],
+    "wallets": [
+        IndexModel([("userId", 1)]),
+        # /ranking ricos
+        IndexModel([("balance", -1)]),
+    ],
+    "wallet_transactions": [
+        IndexModel([("userId", 1), ("date", -1)]),
+        # Idempotent ledger upserts when a bolão settlement is resumed
+        IndexModel([("id", 1)]),
+    ],
+    "user_stats": [
+        IndexModel([("userId", 1)]),
+        # /ranking ganhadores and /ranking ativos
+        IndexModel([("totalWinnings", -1)]),
+        IndexModel([("totalBets", -1)]),
+    ],
+    "bets": [
+        # /minhas-apostas pages on the (createdAt, _id) keyset
+        IndexModel([("userId", 1), ("status", 1), ("createdAt", -1), ("_id", -1)]),
+    ],
+    "user_inventory": [
+        IndexModel([("redemptionCode", 1)]),
+    ],
+    "invites": [
+        IndexModel([("inviterId", 1)]),
+        # Finding who invited a member when they leave
+        IndexModel([("guildId", 1), ("inviteeId", 1), ("timestamp", -1)]),
+    ],
+    "invite_counters": [
+        IndexModel([("net", -1)]),
+    ],
+    "member_activity": [
+        IndexModel([("guildId", 1), ("userId", 1), ("timestamp", -1)]),
+    ],
+    "quizzes": [
+        IndexModel([("schedule", 1)]),
+    ],
+    "player_guessing_games": [
+        IndexModel([("status", 1)]),
+    ],
+    "bolao_entries": [
+        # One entry per user and bolão
+        IndexModel([("bolaoId", 1), ("userId", 1)], unique=True),
+    ],
+    "promo_codes": [
+        # The code allocator relies on this index to reject colliding codes
+        IndexModel([("code", 1)], unique=True, name="code_unique"),
+        # Deletes expired DAILY codes; admin codes have no expiresAt and are never touched
+        IndexModel(
+            [("expiresAt", 1)],
+            expireAfterSeconds=DAILY_CODE_RETENTION_SECONDS,
+            partialFilterExpression={"type": "DAILY"},
+            name="daily_expiresAt_ttl"
+        ),
+    ],
+}
+
+# Representative queries from the cogs, checked with explain by /admin indices:
+# (label, collection, filter, sort)
+DIAGNOSTIC_QUERIES = [
+    ("Usuário por discordId", "users", {"discordId": "0"}, None),
+    ("Ranking de níveis", "users", {}, [("level", -1), ("xp", -1)]),
+    ("Carteira por userId", "wallets", {"userId": "0"}, None),
+    ("Ranking de ricos", "wallets", {}, [("balance", -1)]),
+    ("Extrato por userId", "wallet_transactions", {"userId": "0"}, [("date", -1)]),
+    ("Estatísticas por userId", "user_stats", {"userId": "0"}, None),
+    ("Ranking de ganhadores", "user_stats", {"totalWinnings": {"$gt": 0}}, [("totalWinnings", -1)]),
+    ("Ranking de ativos", "user_stats", {}, [("totalBets", -1)]),
+    ("Apostas em aberto", "bets", {"userId": "0", "status": "Em Aberto"}, [("createdAt", -1), ("_id", -1)]),
+    ("Resgate de item", "user_inventory", {"redemptionCode": "0"}, None),
+    ("Convites por convidador", "invites", {"inviterId": "0"}, None),
+    ("Convite de um membro", "invites", {"guildId": "0", "inviteeId": "0"}, [("timestamp", -1)]),
+    ("Ranking de convites", "invite_counters", {"net": {"$gt": 0}}, [("net", -1)]),
+    ("Quizzes agendados", "quizzes", {"schedule": {"$exists": True, "$nin": [None, [], ""]}}, None),
+    ("Jogo do jogador ativo", "player_guessing_games", {"status": "active"}, None),
+    ("Palpite no bolão", "bolao_entries", {"bolaoId": "0", "userId": "0"}, None),
+    ("Código promocional", "promo_codes", {"code": "0"}, None),
+]
+
+
+# Options that change what an index enforces, so an index only counts as present when they match
+INDEX_OPTIONS = ("unique", "expireAfterSeconds", "partialFilterExpression")
+
+
+def index_key(keys) -> tuple:
+    # index_information may report directions as floats
+    return tuple(
+        (field, int(direction) if isinstance(direction, (int, float)) else direction)
+        for field, direction in keys
+    )
+
+
+def index_signature(keys, options: dict) -> tuple:
+    return (
+        index_key(keys),
+        bool(options.get("unique", False)),
+        options.get("expireAfterSeconds"),
+        dict(options["partialFilterExpression"]) if options.get("partialFilterExpression") else None,
+    )
+
+
+def planned_signature(index: IndexModel) -> tuple:
+    return index_signature(index.document["key"].items(), index.document)
+
+
+async def existing_signatures(collection) -> list:
+    return [index_signature(info["key"], info) for info in (await collection.index_information()).values()]
+
+
+async def has_planned_index(db, collection_name: str, name: str) -> bool:
+    """Whether the planned index called `name` exists with the planned key and options."""
+    index = next(index for index in INDEX_PLAN[collection_name] if index.document["name"] == name)
+    return planned_signature(index) in await existing_signatures(db[collection_name])
+
+
+async def ensure_collection_indexes(db, collection_name: str) -> list:
+    """Creates the planned indexes of one collection that don't exist yet with the same key and options.
+
+    An index with the planned key but different options (e.g. a non-unique code_1)
+    makes the creation fail; that is reported and left for an admin to resolve,
+    since dropping it automatically could leave the collection with no index at all.
+    """
+    collection = db[collection_name]
+    existing = await existing_signatures(collection)
+    created = []
+    for index in INDEX_PLAN.get(collection_name, []):
+        if planned_signature(index) in existing:
+            continue
+        try:
+            await collection.create_indexes([index])
+            created.append(index.document["name"])
+        except OperationFailure as e:
+            print(f"Could not create index {index.document['name']} on {collection_name}: {e}")
+    return created
+
+
+async def ensure_indexes(db) -> dict:
+    """Brings every collection in INDEX_PLAN up to the plan. Returns {collection: [created names]}."""
+    created = {}
+    for collection_name in INDEX_PLAN:
+        try:
+            names = await ensure_collection_indexes(db, collection_name)
+            if names:
+                created[collection_name] = names
+        except Exception as e:
+            print(f"Error creating indexes for {collection_name}: {e}")
+    if created:
+        print(f"Created missing indexes: {created}")
+    return created
+
+
+def start_index_bootstrap(bot, db):
+    """Builds missing indexes in the background once per bot, without delaying startup."""
+    if getattr(bot, 'index_bootstrap', None) is None:
+        bot.index_bootstrap = asyncio.get_running_loop().create_task(ensure_indexes(db))
+    return bot.index_bootstrap
+
+
+def plan_stages(plan) -> list:
+    """Every stage name in an explain plan tree."""
+    if isinstance(plan, list):
+        return [stage for child in plan for stage in plan_stages(child)]
+    if not isinstance(plan, dict):
+        return []
+    stages = [plan["stage"]] if "stage" in plan else []
+    for value in plan.values():
+        if isinstance(value, (dict, list)):
+            stages.extend(plan_stages(value))
+    return stages
+
+
+async def find_collection_scans(db) -> list:
+    """Explains every diagnostic query. Returns (label, collection, stages) for those that scan."""
+    scans = []
+    for label, collection_name, query, sort in DIAGNOSTIC_QUERIES:
+        cursor = db[collection_name].find(query).limit(10)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        stages = plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+        if "COLLSCAN" in stages:
+            scans.append((label, collection_name, stages))
+    return scans
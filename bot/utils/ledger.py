@@ -0,0 +1,50 @@
+import datetime
+from bson.objectid import ObjectId
+
+# Cap on the transactions embedded in the wallet, or None to keep them all. The site's
+# wallet page only reads the embedded array, and the site's own payouts and purchases are
+# pushed there without a ledger entry, so a cap would delete history that exists nowhere
+# else. Leave this as None until the site writes to and reads from wallet_transactions
+# and old arrays are backfilled.
+# Bolão.complete_settlement skips payouts already in wallet_transactions, but when a
+# settlement stopped between its wallet and ledger writes it relies on the payout id still
+# being in the embedded array. With a cap, a winner with enough newer transactions before
+# the resume would be paid twice.
+RECENT_TRANSACTIONS_LIMIT = None
+
+
+def new_transaction(type: str, description: str, amount: float, status: str = "Concluído") -> dict:
+    return {
+        "id": str(ObjectId()),
+        "type": type,
+        "description": description,
+        "amount": amount,
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "status": status
+    }
+
+
+def wallet_update(amount: float, transaction: dict) -> dict:
+    """Update that changes the balance and prepends `transaction` to the embedded history.
+
+    Prepending with `$position` keeps the newest-first order without asking
+    Mongo to re-sort the whole embedded array.
+    """
+    push = {"$each": [transaction], "$position": 0}
+    if RECENT_TRANSACTIONS_LIMIT is not None:
+        push["$slice"] = RECENT_TRANSACTIONS_LIMIT
+    return {
+        "$inc": {"balance": amount},
+        "$push": {"transactions": push}
+    }
+
+
+def ledger_entry(user_id: str, transaction: dict) -> dict:
+    return {**transaction, "userId": user_id}
+
+
+async def record_transaction(db, user_id: str, amount: float, transaction: dict, upsert: bool = True, session=None):
+    """Applies `amount` to the user's wallet and appends the transaction to the ledger."""
+    await db.wallets.update_one({"userId": user_id}, wallet_update(amount, transaction), upsert=upsert, session=session)
+    await db.wallet_transactions.insert_one(ledger_entry(user_id, transaction), session=session)
+
@@ -0,0 +1,94 @@
+import asyncio
+import datetime
+import heapq
+import itertools
+from zoneinfo import ZoneInfo
+
+SAO_PAULO_TZ = ZoneInfo('America/Sao_Paulo')
+
+
+class DailyJob:
+    """A callback that runs every day at `time_str` ('HH:MM', São Paulo time).
+
+    The callback receives the scheduled 'HH:MM' and the 'YYYY-MM-DD' day it
+    belongs to, which is what the trigger bookkeeping in the DB is keyed by.
+    """
+
+    def __init__(self, key: tuple, time_str: str, callback):
+        self.key = key
+        self.time_str = time_str
+        self.callback = callback
+        hour, minute = time_str.split(':')
+        self.time = datetime.time(int(hour), int(minute))
+
+    def fire_at_on(self, day: datetime.date) -> datetime.datetime:
+        return datetime.datetime.combine(day, self.time, tzinfo=SAO_PAULO_TZ)
+
+    def next_fire(self, now: datetime.datetime, grace: datetime.timedelta) -> datetime.datetime:
+        """Today's fire time if it is still ahead or was missed by less than `grace`, else tomorrow's."""
+        fire_at = self.fire_at_on(now.date())
+        if fire_at + grace < now:
+            fire_at = self.fire_at_on(now.date() + datetime.timedelta(days=1))
+        return fire_at
+
+
+class DailyScheduler:
+    """Sleeps until the earliest due job in a min-heap of next fire datetimes.
+
+    Jobs that could not run on time (event loop busy, bot restarting) are
+    still run if they are less than `grace_seconds` late.
+    """
+
+    def __init__(self, grace_seconds: int = 300):
+        self.grace = datetime.timedelta(seconds=grace_seconds)
+        self._heap = []  # Stores (fire_at, seq, job)
+        self._counter = itertools.count()
+        self._changed = asyncio.Event()
+        self._running = set()  # Strong references to job tasks still running
+        self.job_keys = frozenset()
+
+    def set_jobs(self, jobs: list):
+        """Replaces every scheduled job and wakes the run loop to re-evaluate."""
+        now = datetime.datetime.now(SAO_PAULO_TZ)
+        self._heap = [(job.next_fire(now, self.grace), next(self._counter), job) for job in jobs]
+        heapq.heapify(self._heap)
+        self.job_keys = frozenset(job.key for job in jobs)
+        self._changed.set()
+
+    def next_fire_at(self) -> datetime.datetime | None:
+        return self._heap[0][0] if self._heap else None
+
+    async def _run_job(self, job: DailyJob, fire_at: datetime.datetime):
+        try:
+            await job.callback(job.time_str, fire_at.strftime('%Y-%m-%d'))
+        except Exception as e:
+            print(f"Error running scheduled job {job.key}: {e}")
+
+    async def run(self):
+        while True:
+            self._changed.clear()
+            if not self._heap:
+                await self._changed.wait()
+                continue
+
+            fire_at, _, job = self._heap[0]
+            now = datetime.datetime.now(SAO_PAULO_TZ)
+            delay = (fire_at - now).total_seconds()
+            if delay > 0:
+                try:
+                    # Wakes early if the jobs are replaced meanwhile
+                    await asyncio.wait_for(self._changed.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            if now - fire_at <= self.grace:
+                # Long-running jobs (a whole quiz) must not delay the next ones
+                task = asyncio.create_task(self._run_job(job, fire_at))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+            else:
+                print(f"Skipping scheduled job {job.key}: missed by {now - fire_at}.")
+            next_fire = job.fire_at_on(fire_at.date() + datetime.timedelta(days=1))
+            heapq.heappush(self._heap, (next_fire, next(self._counter), job))
@@ -0,0 +1,109 @@
+import asyncio
+import time
+from utils.cooldowns import CooldownStore
+from utils.database import get_client
+
+
+class RegisteredUserCache:
+    """Answers "has this Discord user logged into the site?" from memory.
+
+    Positive answers are kept for hours since accounts are rarely deleted.
+    Negative answers only live for a minute so a member who logs in right
+    after being told to is recognised almost immediately.
+    """
+
+    POSITIVE_TTL_SECONDS = 6 * 3600
+    NEGATIVE_TTL_SECONDS = 60
+
+    def __init__(self, users_collection):
+        self.users = users_collection
+        self.registered = {}  # Stores int(discordId): expires_at (monotonic)
+        self.unregistered = CooldownStore(self.NEGATIVE_TTL_SECONDS)
+        self.hits = 0
+        self.misses = 0
+
+    def mark_registered(self, user_id: str):
+        self.registered[int(user_id)] = time.monotonic() + self.POSITIVE_TTL_SECONDS
+
+    def remember(self, user_id: str, registered: bool):
+        """Stores the result of a lookup made elsewhere (e.g. a read that needed more fields)."""
+        if registered:
+            self.mark_registered(user_id)
+        else:
+            self.registered.pop(int(user_id), None)
+            self.unregistered.hit(int(user_id))
+
+    def cached(self, user_id: str) -> bool | None:
+        """Returns the cached answer for `user_id`, or None if it must be looked up."""
+        key = int(user_id)
+        expires_at = self.registered.get(key)
+        if expires_at and expires_at > time.monotonic():
+            return True
+        if self.unregistered.remaining(key):
+            return False
+        return None
+
+    async def is_registered(self, user_id: str) -> bool:
+        answer = self.cached(user_id)
+        if answer is not None:
+            self.hits += 1
+            return answer
+
+        self.misses += 1
+        user_doc = await self.users.find_one({"discordId": user_id}, {"_id": 1})
+        self.remember(user_id, user_doc is not None)
+        return user_doc is not None
+
+    async def registered_among(self, user_ids: list) -> set:
+        """Returns which of `user_ids` are registered, with one query for all cache misses."""
+        registered = set()
+        unknown = []
+        for user_id in user_ids:
+            answer = self.cached(user_id)
+            if answer is None:
+                unknown.append(user_id)
+            elif answer:
+                registered.add(user_id)
+        self.hits += len(user_ids) - len(unknown)
+
+        if unknown:
+            self.misses += len(unknown)
+            found = {
+                user_doc['discordId']
+                async for user_doc in self.users.find({"discordId": {"$in": unknown}}, {"_id": 0, "discordId": 1})
+            }
+            for user_id in unknown:
+                self.remember(user_id, user_id in found)
+            registered |= found
+        return registered
+
+    async def warm(self) -> int:
+        """Loads every registered discordId with a projection-only scan."""
+        count = 0
+        try:
+            async for user_doc in self.users.find({"discordId": {"$exists": True}}, {"_id": 0, "discordId": 1}):
+                try:
+                    self.mark_registered(user_doc['discordId'])
+                    count += 1
+                except (TypeError, ValueError):
+                    continue
+            print(f"Registered user cache warmed with {count} users.")
+        except Exception as e:
+            print(f"Error warming the registered user cache: {e}")
+        return count
+
+    def stats(self) -> dict:
+        return {
+            "registered": len(self.registered),
+            "unregistered": self.unregistered.stats()["size"],
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def get_user_cache(bot) -> RegisteredUserCache:
+    """Returns the bot-wide registered user cache, creating and warming it on first use."""
+    if getattr(bot, 'user_cache', None) is None:
+        bot.user_cache = RegisteredUserCache(get_client(bot).timaocord.users)
+        asyncio.get_running_loop().create_task(bot.user_cache.warm())
+    return bot.user_cache